@@ -1,11 +1,12 @@
 from manim import *
 from TTSScene import TTSScene
+from ParticleField import ParticleField, FadeInParticles, FadeOutParticles
 
 class Intro(TTSScene):
     def construct(self):
         # Add particle visualization for Avogadro's number
-        particles = VGroup(*[Circle(radius=0.125, color=BLUE, fill_opacity=1) for _ in range(16*9*4)])
-        particles.arrange_in_grid(rows=9*2, cols=16*2, buff=0.125)
+        particles = ParticleField.grid(rows=9*2, cols=16*2, radius=0.125, buff=0.125,
+                                       color=BLUE, stroke_width=DEFAULT_STROKE_WIDTH)
         avogadro_text = Tex("6.022$\\times$10$^{23}$", color=GOLD).scale(1.5)
 
 
@@ -15,7 +16,7 @@ class Intro(TTSScene):
 
             Today, we'll learn about moles and other stuff about converting between different measurements.
             """,
-            LaggedStartMap(FadeIn, particles),
+            FadeInParticles(particles),
             FadeIn(avogadro_text),
             FadeOut(avogadro_text)
         )
@@ -27,7 +28,7 @@ class Intro(TTSScene):
 
         self.add_voice(
             "Understanding these topics is super important in order to have a solid foundation for the rest of Chemistry.",
-            LaggedStartMap(FadeOut, particles),
+            FadeOutParticles(particles),
             Write(title),
             FadeIn(subtitle),
         )
@@ -97,7 +98,7 @@ class MoleConcept(TTSScene):
         self.add_voice(
             """
             Since we often work with incredibly large numbers of particles in Chemistry,
-            we use a number called AhvohGahdroh's Number: ... 6.02 times 10 to the power of 23.
+            we use a number called Avogadro's Number: ... 6.02 times 10 to the power of 23.
             ... ... ...
             This constant represents the number of particles in one mole of anything.
             """,
@@ -291,7 +292,7 @@ class FlowchartInterlude(TTSScene):
             When returning ... divide.
             ...
             When converting between grams and moles, multiply or divide by molecular mass.
-            When converting between particles and moles, multiply or divide by AhvohGahdroh's Number.
+            When converting between particles and moles, multiply or divide by Avogadro's Number.
             """,
             LaggedStart(
                 LaggedStartMap(GrowArrow, arrows, lag_ratio=0),
@@ -330,26 +331,25 @@ class ChemistryConversions(TTSScene):
             "\\\\&= 2.00 \\text{ moles Na}"
         ))
         
-        particles = VGroup(*[Dot(radius=0.03, color=BLUE) for _ in range(100)])
-        particles.arrange_in_grid(rows=10, cols=10, buff=0.1)
+        particles = ParticleField.grid(rows=10, cols=10, radius=0.03, buff=0.1, color=BLUE)
         particle_container = Circle(radius=1.1, color=WHITE, fill_opacity=0)
         particles.move_to(particle_container) 
 
         self.add_voice(
             "Let's look at our first conversion example...",
             Create(particle_container),
-            LaggedStartMap(FadeIn, particles),
+            FadeInParticles(particles),
             Write(example1_problem)
         )
 
         self.add_voice(
             "Here, we are converting Sodium particles to moles.",
-            LaggedStartMap(FadeOut, particles),
+            FadeOutParticles(particles),
             FadeOut(particle_container),
         )
         example1_solution.next_to(example1_problem, DOWN)
         self.add_voice(
-            "Dividing our number of particles by AhvohGahdroh's Number, we get 2 Moles of Sodium.",
+            "Dividing our number of particles by Avogadro's Number, we get 2 Moles of Sodium.",
             Write(example1_solution)
         )
 
@@ -422,25 +422,24 @@ class ChemistryConversions(TTSScene):
         ))
         
         # Animation for particles (Al)
-        particles_al = VGroup(*[Dot(radius=0.03, color=BLUE) for _ in range(150)])
-        particles_al.arrange_in_grid(rows=10, cols=15, buff=0.1)
+        particles_al = ParticleField.grid(rows=10, cols=15, radius=0.03, buff=0.1, color=BLUE)
         particle_container_al = Circle(radius=1.5, color=WHITE, fill_opacity=0)
         particles_al.move_to(particle_container_al)
 
         self.add_voice(
             """
             Finally, let's convert 1.50 moles of aluminum to atoms.
-            To find the number of atoms, we'll multiply the moles by AhvohGahdroh's Number
+            To find the number of atoms, we'll multiply the moles by Avogadro's Number
             """,
             FadeOut(example3_problem, example3_solution),
             Create(particle_container_al),
-            LaggedStartMap(FadeIn, particles_al),
+            FadeInParticles(particles_al),
             Write(example4_problem)
         )
 
         self.add_voice(
             "Multiplying 1.50 moles by 6.02 times 10 to the power of 23 particles per mole, we get 9.03 times 10 to the power of 23 aluminum atoms.",
-            LaggedStartMap(FadeOut, particles_al),
+            FadeOutParticles(particles_al),
             FadeOut(particle_container_al),
             Write(example4_solution)
         )
@@ -1,16 +1,148 @@
+import os
+import json
+import argparse
+import importlib
+import resource
+import multiprocessing
+import time
+import threading
+import concurrent.futures
 import sounddevice as sd
 import soundfile as sf
 from kokoro_onnx import Kokoro
+from onnxruntime import InferenceSession, SessionOptions, GraphOptimizationLevel, get_available_providers
+from PhonemeCache import PhonemeCache
+import profiling
 
-class KokoroTTS(Kokoro):
-    def __init__(self):
-        super().__init__("kokoro-v0_19.onnx", "voices.json")
+# Model file of every variant, the quantized ones trade some quality for speed and memory
+MODEL_VARIANTS = {
+    "fp32": "kokoro-v0_19.onnx",
+    "fp16": "kokoro-v0_19.fp16.onnx",
+    "int8": "kokoro-quant.onnx",
+}
+MODEL_VARIANT = os.environ.get("MANIMTTS_MODEL_VARIANT", "fp32")
+if MODEL_VARIANT not in MODEL_VARIANTS:
+    raise ValueError(
+        f"Unknown MANIMTTS_MODEL_VARIANT {MODEL_VARIANT!r}, use one of: {', '.join(MODEL_VARIANTS)}"
+    )
+MODEL_PATH = MODEL_VARIANTS[MODEL_VARIANT]
+VOICES_PATH = "voices.json"
+DEFAULT_VOICE = "am_adam"
+SPEED = 1.0
+LANG = "en-us"
 
-    def generate(self, voice: str, msg: str):
-        return self.create(
-            msg, voice=voice,
-            speed=1.0, lang="en-us"
+# Synthesizer class to use instead of KokoroTTS as "module:Class", such as the benchmark stub
+TTS_BACKEND = os.environ.get("MANIMTTS_TTS_BACKEND")
+
+# ONNX Runtime threads within and across operators, 0 lets it use every core.
+# Lower them when synthesis runs next to parallel renders.
+INTRA_OP_THREADS = int(os.environ.get("MANIMTTS_ORT_THREADS", 0))
+INTER_OP_THREADS = int(os.environ.get("MANIMTTS_ORT_INTER_THREADS", 0))
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+GRAPH_OPTIMIZATION = os.environ.get("MANIMTTS_ORT_OPTIMIZATION", "all")
+# The arena keeps memory between runs, faster but holds on to the peak
+MEM_ARENA = os.environ.get("MANIMTTS_ORT_MEM_ARENA", "1") == "1"
+
+# Spoken by the calibration, a few sentences of typical narration
+CALIBRATION_TEXT = (
+    "A mole is a counting unit, like a dozen. "
+    "While a dozen means twelve, a mole means six point oh two times ten to the power of twenty three. "
+    "That's a lot of atoms!"
+)
+
+def session_options(
+    intra_op_threads=INTRA_OP_THREADS,
+    inter_op_threads=INTER_OP_THREADS,
+    graph_optimization=GRAPH_OPTIMIZATION,
+    mem_arena=MEM_ARENA,
+):
+    """ONNX Runtime settings of a synthesis session, defaulting to the MANIMTTS_ORT_* environment variables."""
+    options = SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[graph_optimization]
+    options.enable_cpu_mem_arena = mem_arena
+    return options
+
+def session_providers():
+    """
+    ONNX Runtime providers of a synthesis session.
+
+    The one the ONNX_PROVIDER environment variable names, otherwise every
+    available provider in ONNX Runtime's order of preference, so a GPU is
+    used whenever onnxruntime-gpu is installed.
+    """
+    available = get_available_providers()
+    requested = os.getenv("ONNX_PROVIDER")
+    if not requested:
+        return available
+    if requested not in available:
+        raise ValueError(f"ONNX_PROVIDER {requested!r} is not available, use one of: {', '.join(available)}")
+    return [requested]
+
+class KokoroTTS:
+    def __init__(self, variant=MODEL_VARIANT, options=None):
+        """
+        Kokoro synthesis with a configurable model variant and inference session.
+
+        Voice caches key clips by the model file of MANIMTTS_MODEL_VARIANT,
+        so builds pick the variant through that variable rather than here.
+
+        Args:
+            variant: Model to load, one of MODEL_VARIANTS
+            options: SessionOptions, see session_options (default: from the environment)
+        """
+        session = InferenceSession(
+            MODEL_VARIANTS[variant],
+            sess_options=options or session_options(),
+            providers=session_providers(),
         )
+        self.kokoro = Kokoro.from_session(session, VOICES_PATH)
+        self.variant = variant
+        # Phoneme cache of every voice cache synthesized for, by path
+        self.phoneme_caches = {}
+        self.phoneme_caches_lock = threading.Lock()
+
+    @staticmethod
+    def list_voices(voices_path: str = VOICES_PATH):
+        """List the available voices without starting an inference session."""
+        with open(voices_path) as f:
+            return sorted(json.load(f).keys())
+
+    def phonemize(self, msg: str, phonemes_path=None):
+        """
+        Phonemes of a message, with the pronunciation overrides applied.
+
+        Args:
+            msg: Message to phonemize
+            phonemes_path: Phoneme cache to use, the one of the voice cache the
+                clip is for (default: one kept in memory only)
+        """
+        with self.phoneme_caches_lock:
+            if phonemes_path not in self.phoneme_caches:
+                self.phoneme_caches[phonemes_path] = PhonemeCache(phonemes_path)
+            phoneme_cache = self.phoneme_caches[phonemes_path]
+        with profiling.span("phonemize", chars=len(msg)):
+            return phoneme_cache.phonemize(msg, LANG, self.kokoro.tokenizer)
+
+    def create(self, text: str, voice: str, speed: float = 1.0, lang: str = "en-us", phonemes=None):
+        return self.kokoro.create(text, voice=voice, speed=speed, lang=lang, phonemes=phonemes)
+
+    def generate(self, voice: str, msg: str, phonemes_path=None):
+        phonemes = self.phonemize(msg, phonemes_path)
+        with profiling.span("synthesize", voice=voice, chars=len(msg)) as event:
+            samples, sample_rate = self.create(
+                msg, voice=voice,
+                speed=SPEED, lang=LANG,
+                phonemes=phonemes
+            )
+            event["audio_seconds"] = len(samples) / sample_rate
+        return samples, sample_rate
 
     def play(self, voice: str, msg: str):
         data = self.generate(voice, msg)
@@ -19,13 +151,141 @@ class KokoroTTS(Kokoro):
         sd.play(*data)
         sd.wait()
 
-    def save(self, voice: str, msg: str, fname: str):
-        data = self.generate(voice, msg)
+    def save(self, voice: str, msg: str, fname: str, format=None, subtype=None, phonemes_path=None):
+        data = self.generate(voice, msg, phonemes_path)
 
         print(f"Saving to {fname}")
-        sf.write(f"{fname}", *data)
+        sf.write(f"{fname}", *data, format=format, subtype=subtype)
+
+    def generate_many(self, jobs, workers=1, ordered=True, phonemes_path=None):
+        """
+        Synthesize several messages through the same inference session.
+
+        Args:
+            jobs: List of (voice, msg) pairs
+            workers: Number of messages synthesized concurrently
+            ordered: Yield results in job order instead of as they finish
+            phonemes_path: Phoneme cache to use, see phonemize
+
+        Yields:
+            (index, (samples, sample_rate)) for every job
+        """
+        start = time.perf_counter()
+        chars = 0
+        audio_seconds = 0.0
+
+        # Jobs of the same voice run back to back
+        order = sorted(range(len(jobs)), key=lambda i: jobs[i][0])
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.generate, *jobs[i], phonemes_path): i for i in order}
+            if ordered:
+                by_index = {i: future for future, i in futures.items()}
+                finished = (by_index[i] for i in range(len(jobs)))
+            else:
+                finished = concurrent.futures.as_completed(futures)
+
+            for future in finished:
+                i = futures[future]
+                samples, sample_rate = future.result()
+                chars += len(jobs[i][1])
+                audio_seconds += len(samples) / sample_rate
+                yield i, (samples, sample_rate)
+
+        elapsed = time.perf_counter() - start
+        if jobs and elapsed > 0:
+            print(
+                f"Synthesized {len(jobs)} messages in {elapsed:.1f}s: "
+                f"{chars / elapsed:.0f} chars/s, "
+                f"{audio_seconds / elapsed:.2f} audio seconds per second"
+            )
+
+    def save_many(self, jobs, workers=1, format=None, subtype=None, phonemes_path=None):
+        """
+        Synthesize several messages to files through the same inference session.
+
+        Args:
+            jobs: List of (voice, msg, fname) triples
+            workers: Number of messages synthesized concurrently
+            phonemes_path: Phoneme cache to use, see phonemize
+        """
+        results = self.generate_many(
+            [(voice, msg) for voice, msg, _ in jobs],
+            workers=workers, ordered=False, phonemes_path=phonemes_path
+        )
+        for i, data in results:
+            fname = jobs[i][2]
+            print(f"Saving to {fname}")
+            sf.write(f"{fname}", *data, format=format, subtype=subtype)
+
+def create_tts():
+    """Create the synthesizer of this process, a KokoroTTS unless MANIMTTS_TTS_BACKEND names another class."""
+    if not TTS_BACKEND:
+        return KokoroTTS()
+    module_name, class_name = TTS_BACKEND.split(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+def measure(variant, threads, voice=DEFAULT_VOICE, text=CALIBRATION_TEXT, repeat=3):
+    """
+    Time a model variant in this process.
+
+    Returns:
+        Dict with the load time, the seconds spent per second of audio
+        ("rtf") after a warm-up run, and the peak memory of the process
+    """
+    start = time.perf_counter()
+    tts = KokoroTTS(variant, session_options(intra_op_threads=threads))
+    load_seconds = time.perf_counter() - start
+    tts.generate(voice, text)
+
+    start = time.perf_counter()
+    audio_seconds = 0.0
+    for _ in range(repeat):
+        samples, sample_rate = tts.generate(voice, text)
+        audio_seconds += len(samples) / sample_rate
+    return {
+        "variant": variant,
+        "threads": threads,
+        "load_s": load_seconds,
+        "rtf": (time.perf_counter() - start) / audio_seconds,
+        # ru_maxrss is in kilobytes
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+def calibrate(variants, thread_counts, repeat=3):
+    """Measure every variant with every thread count, each in a fresh process so their memory is not shared."""
+    results = []
+    print(f"{'Variant':<8}{'Threads':>8}{'Load (s)':>10}{'RTF':>8}{'RSS (MB)':>10}")
+    for variant in variants:
+        if not os.path.exists(MODEL_VARIANTS[variant]):
+            print(f"{variant:<8}  {MODEL_VARIANTS[variant]} not found, skipped")
+            continue
+        for threads in thread_counts:
+            context = multiprocessing.get_context("spawn")
+            with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(measure, variant, threads, repeat=repeat).result()
+            print(f"{variant:<8}{threads or 'all':>8}{result['load_s']:>10.2f}{result['rtf']:>8.3f}{result['rss_mb']:>10.0f}")
+            results.append(result)
+    return results
 
 def main():
+    parser = argparse.ArgumentParser(description='Play a sample message, or calibrate the model variants on this CPU.')
+    parser.add_argument('--calibrate', action='store_true',
+                        help='Report the real-time factor and memory of every model variant')
+    parser.add_argument('--variants', nargs='+', choices=list(MODEL_VARIANTS), default=list(MODEL_VARIANTS),
+                        help='Variants to calibrate (default: all)')
+    parser.add_argument('--threads', nargs='+', type=int, default=[INTRA_OP_THREADS],
+                        help='Intra-op thread counts to calibrate, 0 for every core (default: MANIMTTS_ORT_THREADS)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per measurement (default: 3)')
+    parser.add_argument('--json', help='Also write the calibration results to this JSON file')
+    args = parser.parse_args()
+
+    if args.calibrate:
+        results = calibrate(args.variants, args.threads, args.repeat)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        return
+
     kokoro = KokoroTTS() # or am_michael
     # kokoro.play("Hi! This audio was generated by ko-ko-ro, the revolutionary Text-to-Speech model.")
     kokoro.play("am_adam", "Is this a question? ... Or is this? ... ... I'm unsure.") #, "test.wav")
@@ -0,0 +1,247 @@
+import numpy as np
+from manim import Animation, Circle, VMobject, ManimColor, WHITE, DEFAULT_DOT_RADIUS, linear, smooth
+from manim.animation.composition import DEFAULT_LAGGED_START_LAG_RATIO
+
+# Opacities are rounded to this many steps when particles are grouped, finer than 8-bit frames can show
+OPACITY_LEVELS = 255
+
+
+class ParticleField(VMobject):
+    def __init__(self, positions, radius=DEFAULT_DOT_RADIUS, color=WHITE, fill_opacity=1.0,
+                 stroke_width=0.0, stroke_opacity=1.0, **kwargs):
+        """
+        Many circles drawn as a few mobjects.
+
+        Particles with the same color and opacity are drawn together as one
+        VMobject whose subpaths are their circles, so a field costs a handful
+        of mobjects per frame instead of one per particle. Each particle looks
+        like Circle(radius, color=color, fill_opacity, stroke_width) at its
+        position, and index i is the i-th submobject of the VGroup it
+        replaces, so lagged animations run in the same order.
+
+        Moving, scaling and rotating the field (also with .animate) work like
+        on any mobject. Per-particle colors and opacities change through
+        set_particle_colors/set_particle_opacities, or over time with
+        FadeInParticles, FadeOutParticles and TransformParticles.
+
+        Args:
+            positions: Centers of the particles, (n, 2) or (n, 3)
+            radius: Radius of every particle, or one per particle
+            color: Color of every particle, or one per particle
+            fill_opacity: Fill opacity of the particles at full opacity
+            stroke_width: Width of the outlines, which have the particle's color
+            stroke_opacity: Stroke opacity of the particles at full opacity
+            **kwargs: Additional arguments passed to VMobject
+        """
+        super().__init__(fill_opacity=0, stroke_width=0, **kwargs)
+        positions = np.asarray(positions, dtype=float).reshape(len(positions), -1)
+        positions = np.pad(positions, ((0, 0), (0, 3 - positions.shape[1])))
+        radii = np.broadcast_to(np.asarray(radius, dtype=float), len(positions))
+
+        self.particle_fill_opacity = fill_opacity
+        self.particle_stroke_width = stroke_width
+        self.particle_stroke_opacity = stroke_opacity
+        self.colors = np.zeros((len(positions), 3))
+        self.opacities = np.ones(len(positions))
+        self._set_colors(color)
+
+        # Groups are reused rather than replaced, scenes keep the family they saw when an animation began
+        self.batches = []
+
+        template = Circle(radius=1).points
+        self.points_per_particle = len(template)
+        self.regroup(positions[:, None, :] + radii[:, None, None] * template[None])
+
+    @classmethod
+    def grid(cls, rows, cols, radius=DEFAULT_DOT_RADIUS, buff=0.25, **kwargs):
+        """
+        Particles filling a grid row by row from the top left, centered on the origin.
+
+        Places them like VGroup(...).arrange_in_grid(rows=rows, cols=cols, buff=buff).
+        """
+        spacing = 2 * radius + buff
+        row, col = np.divmod(np.arange(rows * cols), cols)
+        positions = np.column_stack([
+            (col - (cols - 1) / 2) * spacing,
+            ((rows - 1) / 2 - row) * spacing,
+        ])
+        return cls(positions, radius=radius, **kwargs)
+
+    @property
+    def num_particles(self):
+        """Number of particles, len() counts the batches like any mobject's submobjects."""
+        return len(self.opacities)
+
+    def get_particle_points(self):
+        """Bezier points of every particle's circle, (n, points per circle, 3)."""
+        points = np.zeros((self.num_particles, self.points_per_particle, 3))
+        for batch in self.batches:
+            points[batch.particle_indices] = batch.points.reshape(-1, self.points_per_particle, 3)
+        return points
+
+    def get_positions(self):
+        """Centers of the particles, (n, 3)."""
+        return self.get_particle_points().mean(axis=1)
+
+    def get_radii(self):
+        """Radii of the particles, (n,)."""
+        points = self.get_particle_points()
+        return np.linalg.norm(points[:, 0] - points.mean(axis=1), axis=1)
+
+    def _set_colors(self, colors):
+        # One color is a name, hex string, ManimColor or numeric RGB triple, anything else is one per particle
+        if (isinstance(colors, (str, ManimColor))
+                or np.ndim(colors) == 1 and np.issubdtype(np.asarray(colors).dtype, np.number)):
+            colors = [colors]
+        rgbs = np.array([ManimColor(color).to_rgb() for color in colors])
+        self.colors[:] = np.broadcast_to(rgbs, self.colors.shape)
+
+    def set_particle_colors(self, colors):
+        """Set the color of every particle, to one color or one per particle."""
+        points = self.get_particle_points()
+        self._set_colors(colors)
+        return self.regroup(points)
+
+    def set_particle_opacities(self, opacities):
+        """Set the opacity of every particle, a factor on its fill and stroke opacity."""
+        points = self.get_particle_points()
+        self.opacities[:] = np.clip(opacities, 0, 1)
+        return self.regroup(points)
+
+    def set_color(self, color, family=True):
+        if not hasattr(self, "batches"):
+            # Called by VMobject.__init__ before the particles exist
+            return super().set_color(color, family)
+        return self.set_particle_colors(color)
+
+    def interpolate_color(self, mobject1, mobject2, alpha):
+        # Keeps the particle styles in step with the groups during a Transform between two fields
+        if isinstance(mobject1, ParticleField) and isinstance(mobject2, ParticleField):
+            self.colors[:] = mobject1.colors + (mobject2.colors - mobject1.colors) * alpha
+            self.opacities[:] = mobject1.opacities + (mobject2.opacities - mobject1.opacities) * alpha
+        return super().interpolate_color(mobject1, mobject2, alpha)
+
+    def regroup(self, points=None):
+        """
+        Sort the particles into one VMobject per color and opacity.
+
+        Args:
+            points: Bezier points of every particle (default: their current ones)
+        """
+        if points is None:
+            points = self.get_particle_points()
+        levels = np.round(self.opacities * OPACITY_LEVELS).astype(int)
+        keys = np.column_stack([np.round(self.colors * 255).astype(int), levels])
+        unique_keys, group_of = np.unique(keys, axis=0, return_inverse=True)
+        group_of = group_of.ravel()
+        while len(self.batches) < len(unique_keys):
+            batch = VMobject()
+            self.batches.append(batch)
+            self.add(batch)
+
+        for i, batch in enumerate(self.batches):
+            if i >= len(unique_keys):
+                batch.particle_indices = np.arange(0)
+                batch.clear_points()
+                continue
+            indices = np.flatnonzero(group_of == i)
+            batch.particle_indices = indices
+            batch.points = points[indices].reshape(-1, 3)
+
+            color = ManimColor.from_rgb(unique_keys[i, :3] / 255)
+            opacity = unique_keys[i, 3] / OPACITY_LEVELS
+            batch.set_fill(color, self.particle_fill_opacity * opacity)
+            # Invisible strokes would still be drawn
+            stroke_width = self.particle_stroke_width if opacity > 0 else 0
+            batch.set_stroke(color, stroke_width, self.particle_stroke_opacity * opacity)
+        return self
+
+
+class LaggedParticleAnimation(Animation):
+    def __init__(self, field, lag_ratio=DEFAULT_LAGGED_START_LAG_RATIO, particle_rate_func=smooth,
+                 run_time=2, rate_func=linear, **kwargs):
+        """
+        An animation of every particle of a field, each starting a bit after the one before.
+
+        Times every particle like LaggedStartMap(AnimationClass, group) times
+        the animations of its submobjects, all at once with NumPy.
+
+        Args:
+            field: ParticleField to animate
+            lag_ratio: Part of a particle's animation that runs before the next particle starts
+            particle_rate_func: Rate function of every particle's animation
+            run_time: Length of the whole animation (in seconds)
+            rate_func: Rate function of the whole animation
+            **kwargs: Additional arguments passed to Animation
+        """
+        super().__init__(field, run_time=run_time, rate_func=rate_func, **kwargs)
+        # Rate functions take one alpha at a time
+        self.particle_rate_func = np.vectorize(particle_rate_func, otypes=[float])
+        self.starts = np.arange(field.num_particles) * lag_ratio
+        self.total = self.starts[-1] + 1 if field.num_particles else 1
+
+    def interpolate_mobject(self, alpha):
+        particle_alphas = np.clip(self.rate_func(alpha) * self.total - self.starts, 0, 1)
+        self.interpolate_particles(self.particle_rate_func(particle_alphas))
+
+    def interpolate_particles(self, alphas):
+        """Set every particle to its own progress, (n,) values from 0 to 1."""
+        raise NotImplementedError
+
+
+class FadeInParticles(LaggedParticleAnimation):
+    def __init__(self, field, **kwargs):
+        """Fade the particles in one after another, like LaggedStartMap(FadeIn, group)."""
+        super().__init__(field, introducer=True, **kwargs)
+        self.target_opacities = field.opacities.copy()
+
+    def interpolate_particles(self, alphas):
+        self.mobject.set_particle_opacities(self.target_opacities * alphas)
+
+
+class FadeOutParticles(LaggedParticleAnimation):
+    def __init__(self, field, **kwargs):
+        """Fade the particles out one after another, like LaggedStartMap(FadeOut, group)."""
+        super().__init__(field, remover=True, **kwargs)
+        self.start_opacities = field.opacities.copy()
+
+    def interpolate_particles(self, alphas):
+        self.mobject.set_particle_opacities(self.start_opacities * (1 - alphas))
+
+    def clean_up_from_scene(self, scene):
+        super().clean_up_from_scene(scene)
+        # Like FadeOut, the field is back to how it was once it left the scene
+        self.interpolate(0)
+
+
+class TransformParticles(LaggedParticleAnimation):
+    def __init__(self, field, target, lag_ratio=0, run_time=1, **kwargs):
+        """
+        Move every particle to the place, size, color and opacity of the same particle of another field.
+
+        With the default lag_ratio of 0 this matches Transform(field, target),
+        a positive one makes the particles follow each other like
+        LaggedStartMap(Transform, ...). The target field is not added to the
+        scene.
+
+        Args:
+            field: ParticleField to animate
+            target: ParticleField with the same number of particles
+        """
+        if target.num_particles != field.num_particles:
+            raise ValueError(f"Cannot transform {field.num_particles} particles into {target.num_particles}")
+        super().__init__(field, lag_ratio=lag_ratio, run_time=run_time, **kwargs)
+        self.target = target
+
+    def begin(self):
+        self.start_points = self.mobject.get_particle_points()
+        self.start_colors = self.mobject.colors.copy()
+        self.start_opacities = self.mobject.opacities.copy()
+        self.target_points = self.target.get_particle_points()
+        super().begin()
+
+    def interpolate_particles(self, alphas):
+        field = self.mobject
+        field.colors[:] = self.start_colors + (self.target.colors - self.start_colors) * alphas[:, None]
+        field.opacities[:] = self.start_opacities + (self.target.opacities - self.start_opacities) * alphas
+        field.regroup(self.start_points + (self.target_points - self.start_points) * alphas[:, None, None])
@@ -0,0 +1,180 @@
+import re
+import json
+import threading
+from pathlib import Path
+from fileutil import file_lock, write_json
+from sentences import sentence_breaks
+
+# Name of the phoneme cache inside a voice cache directory
+PHONEMES_FILE = "phonemes.json"
+# Word -> phonemes, for the words the G2P gets wrong
+PRONUNCIATIONS_PATH = "pronunciations.json"
+
+# Final sounds after which a possessive 's is said "iz" or "s" rather than "z"
+SIBILANTS = ("s", "z", "ʃ", "ʒ", "ʧ", "ʤ")
+VOICELESS = ("p", "t", "k", "f", "θ")
+
+def load_pronunciations(path=PRONUNCIATIONS_PATH) -> dict:
+    """Read the override dictionary, keyed by lowercase word."""
+    try:
+        with open(path) as f:
+            return {word.lower(): phonemes for word, phonemes in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+def possessive(phonemes: str) -> str:
+    """Phonemes of the 's form of a word."""
+    if phonemes.endswith(SIBILANTS):
+        return phonemes + "ɪz"
+    if phonemes.endswith(VOICELESS):
+        return phonemes + "s"
+    return phonemes + "z"
+
+def split_fragments(text: str):
+    """
+    Split a text at the same sentence ends and pauses as split_sentences, keeping the end marks and "..." markers.
+
+    Line breaks become spaces, Kokoro has no phoneme for them.
+    """
+    start = 0
+    for match in sentence_breaks(text):
+        yield " ".join(text[start:match.end()].split())
+        start = match.end()
+    yield " ".join(text[start:].split())
+
+
+class PhonemeCache:
+    def __init__(self, path=None, pronunciations_path=PRONUNCIATIONS_PATH):
+        """
+        Persistent cache of the phonemes of every sentence, with overrides for hard words.
+
+        Messages are normalized like Kokoro does before running the G2P and
+        split into the sentences split_sentences finds, which are stored per
+        language, so a sentence said in several scenes or lectures, or
+        synthesized whole and sentence by sentence, is only phonemized once. Words found in the
+        override dictionary (and their possessive 's) get their phonemes
+        from it, so sources can spell names properly instead of phonetically.
+
+        Args:
+            path: JSON file of the cached phonemes, shared by every process
+                (default: kept in memory only)
+            pronunciations_path: JSON object mapping words to their phonemes
+        """
+        self.path = Path(path) if path is not None else None
+        self.pronunciations = load_pronunciations(pronunciations_path)
+        words = sorted(self.pronunciations, key=len, reverse=True)
+        self.pattern = re.compile(
+            r"\b(" + "|".join(map(re.escape, words)) + r")('s)?\b", re.IGNORECASE
+        ) if words else None
+        self._entries = None
+        # The G2P and the entries are shared by the synthesis threads
+        self._lock = threading.Lock()
+
+    def used_pronunciations(self, text: str) -> dict:
+        """The overrides that apply to a text, for keys of anything synthesized from it."""
+        if self.pattern is None:
+            return {}
+        words = {match.group(1).lower() for match in self.pattern.finditer(text)}
+        return {word: self.pronunciations[word] for word in sorted(words)}
+
+    @property
+    def entries(self) -> dict:
+        """Map of language to the phonemes of every cached fragment."""
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def _read(self) -> dict:
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def phonemize(self, text: str, lang: str, tokenizer) -> str:
+        """
+        Phonemes of a message, as Kokoro's create() takes them.
+
+        Args:
+            text: Message to phonemize
+            lang: Language of the message
+            tokenizer: Kokoro tokenizer that normalizes and phonemizes misses
+
+        Returns:
+            The phonemes of every sentence, separated by spaces
+        """
+        with self._lock:
+            cached = self.entries.setdefault(lang, {})
+            missing = {}
+
+            def lookup(fragment):
+                if fragment not in cached:
+                    cached[fragment] = missing[fragment] = tokenizer.phonemize(fragment, lang, norm=False)
+                return cached[fragment]
+
+            sentences = []
+            for sentence in split_fragments(tokenizer.normalize_text(text)):
+                phonemes = ""
+                position = 0
+                for match in self.pattern.finditer(sentence) if self.pattern else ():
+                    before = sentence[position:match.start()]
+                    if before.strip():
+                        phonemes = self._join(phonemes, lookup(before.strip()), before[:1].isspace())
+                    word = self.pronunciations[match.group(1).lower()]
+                    if match.group(2):
+                        word = possessive(word)
+                    phonemes = self._join(phonemes, word, not before or before[-1:].isspace())
+                    position = match.end()
+
+                rest = sentence[position:]
+                if rest.strip():
+                    phonemes = self._join(phonemes, lookup(rest.strip()), rest[:1].isspace())
+                if phonemes:
+                    sentences.append(phonemes)
+
+            if missing and self.path is not None:
+                self._save(lang, missing)
+        return " ".join(sentences)
+
+    @staticmethod
+    def _join(phonemes: str, fragment: str, space: bool) -> str:
+        """Append the phonemes of a fragment, separated by a space where the text had one."""
+        fragment = fragment.strip()
+        if phonemes and space:
+            return f"{phonemes} {fragment}"
+        return phonemes + fragment
+
+    def _save(self, lang: str, entries: dict):
+        """Add entries to the file, merging with entries written by other processes."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.path.with_name(f"{self.path.name}.lock")):
+            stored = self._read()
+            stored.setdefault(lang, {}).update(entries)
+            write_json(self.path, stored)
+        for cached_lang, fragments in stored.items():
+            self.entries.setdefault(cached_lang, {}).update(fragments)
+
+    def prune(self, texts):
+        """
+        Drop the cached fragments that no longer appear in any of the texts.
+
+        Fragments are compared before normalization, so a few that are
+        still used may be dropped and phonemized again later.
+
+        Returns:
+            Number of fragments dropped
+        """
+        if self.path is None or not self.path.exists():
+            return 0
+        text = "\n".join(" ".join(text.split()) for text in texts)
+        with self._lock, file_lock(self.path.with_name(f"{self.path.name}.lock")):
+            stored = self._read()
+            kept = {
+                lang: {fragment: phonemes for fragment, phonemes in fragments.items() if fragment in text}
+                for lang, fragments in stored.items()
+            }
+            write_json(self.path, kept)
+            self._entries = kept
+        return sum(map(len, stored.values())) - sum(map(len, kept.values()))
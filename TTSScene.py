@@ -1,14 +1,42 @@
-import hashlib
 import os
-from KokoroTTS import KokoroTTS
+import json
+from KokoroTTS import KokoroTTS, DEFAULT_VOICE, create_tts
+from VoiceCache import VoiceCache
+from TTSServer import TTSClient
+import profiling
+import texcache
 from typing import Optional, Union, Callable
-from manim import Scene, Animation, Mobject
+from manim import Scene, Animation, Mobject, Wait, config
+from manim.utils import tex_file_writing
 from pathlib import Path
-import soundfile as sf
+from pydub import AudioSegment
+import numpy as np
+from narration import NARRATION_SAMPLE_RATE, mix_clips
 
-def wav_file_length(path: str):
-    f = sf.SoundFile(path)
-    return f.frames / f.samplerate
+# Where to write the timeline of animations and voices when a scene finishes, if set
+TIMELINE_PATH = os.environ.get("MANIMTTS_TIMELINE")
+
+# Parallel renders of a build share the Tex cache
+texcache.install()
+
+if profiling.PROFILE_PATH:
+    # Tex and MathTex compile through these on a cache miss
+    profiling.wrap(tex_file_writing, "compile_tex", "latex")
+    profiling.wrap(tex_file_writing, "convert_to_svg", "latex_svg")
+
+_shared_tts = None
+
+def get_shared_tts():
+    """Return the process-wide synthesizer, creating it on first use."""
+    global _shared_tts
+    if _shared_tts is None:
+        # Prefer a running TTSServer so the model is only loaded once per build
+        _shared_tts = TTSClient.connect() or create_tts()
+    return _shared_tts
+
+def is_segment_render():
+    """Whether only a range of the scene's animations is rendered (manim -n)."""
+    return config.from_animation_number > 0 or config.upto_animation_number >= 0
 
 
 class TTSScene(Scene):
@@ -21,37 +49,118 @@ class TTSScene(Scene):
             voice_cache_dir: Directory to store cached voice files
             **kwargs: Additional arguments passed to Scene
         """
+        if is_segment_render():
+            # Segments of one scene render in parallel, keep their partial movie files apart
+            suffix = f".seg{config.from_animation_number}"
+            if not config.partial_movie_dir.endswith(suffix):
+                config.partial_movie_dir += suffix
+
         super().__init__(**kwargs)
-        self.tts = KokoroTTS()
-        self.voice_cache_dir = Path("./voices/")
-        self.voice_cache_dir.mkdir(parents=True, exist_ok=True)
+        self.voice_cache = VoiceCache("./voices/")
+        self.voice_cache_dir = self.voice_cache.cache_dir
+
+        # End time of every animation, when every play/wait runs and when every voice plays
+        self.animation_end_times = []
+        self.play_events = []
+        self.voice_events = []
+        # Every voice clip with its start and end time, mixed into one track when the scene ends
+        self.narration_clips = []
+        # Scene time at which a segmented render starts
+        self.segment_start = None
 
-        self.set_voice("am_adam")
+        self.set_voice(DEFAULT_VOICE)
+
+    @property
+    def tts(self):
+        """Synthesizer shared by all scenes, only loaded on the first cache miss."""
+        return get_shared_tts()
 
     def get_voices(self):
-        return self.tts.get_voices()
+        return KokoroTTS.list_voices()
 
     def set_voice(self, voice: str):
         self.voice = voice
 
     def get_voice_hash(self, message: str) -> str:
         """Generate a unique hash for a voice message."""
-        return hashlib.md5((self.voice + message).encode('utf-8')).hexdigest()
+        return self.voice_cache.get_voice_hash(self.voice, message)
     
     def get_voice_path(self, message: str) -> Path:
         """Get the cached voice file path for a message."""
-        voice_hash = self.get_voice_hash(message)
-        return self.voice_cache_dir / f"{voice_hash}.wav"
+        return self.voice_cache.get_voice_path(self.voice, message)
     
     def generate_voice(self, message: str) -> Path:
         """Generate or retrieve cached voice file for a message."""
-        voice_path = self.get_voice_path(message)
-        
-        if not voice_path.exists():
-            self.tts.save(self.voice, message, str(voice_path))
-            
-        return voice_path
+        global _shared_tts
+        with profiling.span("generate_voice", scene=type(self).__name__) as event:
+            # Marks the clip as used, so evictions by other processes delete it last
+            voice_path = self.voice_cache.lookup(self.voice, message)
+            if voice_path is not None:
+                event["cache"] = "hit"
+                return voice_path
+
+            event["cache"] = "miss"
+            try:
+                return self.voice_cache.generate(self.tts, self.voice, message)
+            except ConnectionError:
+                # The server went away, synthesize in this process instead
+                _shared_tts = create_tts()
+                return self.voice_cache.generate(self.tts, self.voice, message)
     
+    def play(self, *args, **kwargs):
+        if (is_segment_render()
+                and self.segment_start is None
+                and self.renderer.num_plays >= config.from_animation_number):
+            self.segment_start = self.renderer.time
+
+        start = self.renderer.time
+        super().play(*args, **kwargs)
+        self.animation_end_times.append(self.renderer.time)
+        self.play_events.append({
+            "kind": "wait" if len(args) == 1 and isinstance(args[0], Wait) else "play",
+            "start": start,
+            "end": self.renderer.time,
+            "animations": [type(arg).__name__.lstrip("_") for arg in args],
+        })
+
+    def add_narration(self, start: float, end: float):
+        """Mix the voice clips between two scene times into one track and add it to the output."""
+        with profiling.span("mix_narration", scene=type(self).__name__, clips=len(self.narration_clips)):
+            track = mix_clips([(path, time) for path, time, _ in self.narration_clips], start, end)
+            samples = (np.clip(track, -1.0, 1.0) * 32767).astype(np.int16)
+            self.renderer.file_writer.add_audio_segment(
+                AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=NARRATION_SAMPLE_RATE, channels=1),
+                0
+            )
+
+    def tear_down(self):
+        super().tear_down()
+
+        # Nothing is written in dry runs, such as when planning. Every scene and segment gets an audio
+        # track, silent without voices, so videos have the same streams with or without segments and
+        # join by stream copy.
+        if config.write_to_movie:
+            if is_segment_render():
+                # As long as the segment's video, so segments concatenate in sync
+                if self.segment_start is not None:
+                    self.add_narration(self.segment_start, self.renderer.time)
+            else:
+                end = max([self.renderer.time] + [time + length for _, time, length in self.narration_clips])
+                self.add_narration(0.0, end)
+
+        if TIMELINE_PATH:
+            with open(TIMELINE_PATH, 'w') as f:
+                json.dump(self.get_timeline(), f)
+
+    def get_timeline(self) -> dict:
+        """When every animation ends, every play/wait runs and every voice plays, and how long the scene is."""
+        return {
+            "duration": self.renderer.time,
+            "animations": self.animation_end_times,
+            "plays": self.play_events,
+            "voices": self.voice_events,
+        }
+
     def add_voice(
         self,
         voice_message: str,
@@ -70,16 +179,28 @@ class TTSScene(Scene):
             min_time: Minimum wait time (in seconds)
             voice_offset: Time offset for voice playback (in seconds)
         """
-        voice_path = self.generate_voice(voice_message)
-        voice_length = wav_file_length(voice_path)
+        scene_name = type(self).__name__
+        with profiling.span("add_voice", scene=scene_name, voice=self.voice, chars=len(voice_message)) as event:
+            voice_path = self.generate_voice(voice_message)
+            with profiling.span("voice_length", scene=scene_name):
+                voice_length = self.voice_cache.get_duration(self.voice, voice_message)
+            event["audio_seconds"] = voice_length
+
+            voice_start = self.renderer.time + voice_offset
+            self.voice_events.append({
+                "animation": self.renderer.num_plays,
+                "voice": self.voice,
+                "start": voice_start,
+                "end": voice_start + voice_length,
+                "message": voice_message,
+                "offset": voice_offset,
+                "factor": voice_factor,
+            })
 
-        # Add sound to the scene with offset
-        self.add_sound(
-            str(voice_path),
-            time_offset=voice_offset
-        )
+            # Mixed with the other clips into the scene's narration track in tear_down
+            self.narration_clips.append((voice_path, voice_start, voice_length))
 
-        if len(args) != 0:
-            self.play(*args, **kwargs)
+            if len(args) != 0:
+                self.play(*args, **kwargs)
 
-        self.wait((voice_length - voice_offset) * voice_factor)
+            self.wait((voice_length - voice_offset) * voice_factor)
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+import os
+import json
+import socket
+import socketserver
+import threading
+import contextlib
+from KokoroTTS import create_tts
+
+SOCKET_PATH = os.environ.get("MANIMTTS_SOCKET", ".tts.sock")
+
+
+class TTSRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        """Serve newline-delimited JSON save requests until the client hangs up."""
+        for line in self.rfile:
+            request = json.loads(line)
+            try:
+                self.server.save(
+                    request["voice"], request["msg"], request["fname"],
+                    request.get("format"), request.get("subtype"), request.get("phonemes_path")
+                )
+                response = {"ok": True}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+class TTSServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        """
+        Local synthesis server owning a single Kokoro session.
+
+        Args:
+            socket_path: Path of the Unix socket to listen on
+        """
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(socket_path)
+        super().__init__(socket_path, TTSRequestHandler)
+
+        self.tts = None
+        self.lock = threading.Lock()
+
+    def save(self, voice: str, msg: str, fname: str, format=None, subtype=None, phonemes_path=None):
+        """Synthesize a message to a file, loading the model on first use."""
+        with self.lock:
+            if self.tts is None:
+                self.tts = create_tts()
+            self.tts.save(voice, msg, fname, format, subtype, phonemes_path=phonemes_path)
+
+    def save_many(self, jobs, workers=1, format=None, subtype=None, phonemes_path=None):
+        """Synthesize a batch of messages to files, loading the model on first use."""
+        with self.lock:
+            if self.tts is None:
+                self.tts = create_tts()
+            self.tts.save_many(jobs, workers, format, subtype, phonemes_path=phonemes_path)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    @classmethod
+    @contextlib.contextmanager
+    def running(cls, socket_path=SOCKET_PATH):
+        """Serve from a background thread for the duration of a with block."""
+        server = cls(socket_path)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TTSClient:
+    def __init__(self, sock):
+        self.sock = sock
+        self.file = sock.makefile('rwb')
+
+    @classmethod
+    def connect(cls, socket_path=SOCKET_PATH):
+        """Connect to a running TTSServer, or return None if there is none."""
+        if not os.path.exists(socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            sock.close()
+            return None
+        return cls(sock)
+
+    def save(self, voice: str, msg: str, fname: str, format=None, subtype=None, phonemes_path=None):
+        """Ask the server to synthesize a message to a file."""
+        request = {
+            "voice": voice,
+            "msg": msg,
+            "fname": os.path.abspath(fname),
+            "format": format,
+            "subtype": subtype,
+            # The server may run in another directory
+            "phonemes_path": phonemes_path and os.path.abspath(phonemes_path),
+        }
+        self.file.write((json.dumps(request) + "\n").encode('utf-8'))
+        self.file.flush()
+
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("TTS server closed the connection")
+        response = json.loads(line)
+        if not response["ok"]:
+            raise RuntimeError(f"TTS server failed: {response['error']}")
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def main():
+    server = TTSServer()
+    print(f"Serving TTS on {server.socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+import os
+import json
+import hashlib
+import contextlib
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import soundfile as sf
+from KokoroTTS import MODEL_PATH, VOICES_PATH, SPEED, LANG, TTS_BACKEND
+from sentences import split_sentences
+from PhonemeCache import PhonemeCache, PHONEMES_FILE
+from fileutil import file_lock, write_json
+
+# Bump whenever the way clips are synthesized or stored changes
+CACHE_VERSION = 3
+
+# Byte budget of the cache, unlimited unless set
+MAX_BYTES = int(float(os.environ.get("MANIMTTS_VOICE_CACHE_MB", 0)) * 1024 * 1024) or None
+
+# File extension and soundfile format/subtype of each storage codec
+CODECS = {
+    "wav": (".wav", None, None),
+    "flac": (".flac", "FLAC", None),
+    "opus": (".opus", "OGG", "OPUS"),
+}
+CODEC = os.environ.get("MANIMTTS_VOICE_CODEC", "flac")
+
+# Synthesize long messages sentence by sentence, caching every sentence on its own
+CHUNKED = os.environ.get("MANIMTTS_VOICE_CHUNKED", "0") == "1"
+# Silence between stitched sentences, and for every "..." marker between them (in seconds)
+SENTENCE_SILENCE = 0.15
+PAUSE_SILENCE = 0.4
+
+def file_fingerprint(path: str) -> str:
+    """Identify a model file by name and size without reading it."""
+    try:
+        return f"{os.path.basename(path)}:{os.path.getsize(path)}"
+    except OSError:
+        return os.path.basename(path)
+
+
+class VoiceCache:
+    def __init__(
+        self,
+        cache_dir="./voices/",
+        max_bytes=MAX_BYTES,
+        codec=CODEC,
+        chunked=CHUNKED,
+        sentence_silence=SENTENCE_SILENCE,
+        pause_silence=PAUSE_SILENCE,
+    ):
+        """
+        Content-addressed cache of synthesized voice clips on disk.
+
+        Clips are keyed by every parameter that affects the audio, written
+        atomically and synthesized under a per-entry lock, so parallel scene
+        processes never read half-written files or synthesize a clip twice.
+        The duration, sample rate and size of every clip are kept in an
+        index so timing lookups never open the audio files.
+
+        Args:
+            cache_dir: Directory to store cached voice files
+            max_bytes: Size budget, least recently used clips are evicted beyond it by
+                evict_to_budget, which builds call once they no longer need their clips
+            codec: Storage codec of new clips, one of "flac" (lossless), "opus" or "wav"
+            chunked: Synthesize and cache messages sentence by sentence, so editing
+                one sentence only re-synthesizes that sentence
+            sentence_silence: Silence inserted between stitched sentences (in seconds)
+            pause_silence: Extra silence for every "..." marker between sentences (in seconds)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / "index.json"
+        self._index = None
+        self.max_bytes = max_bytes
+        self.codec = codec
+        self.extension, self.format, self.subtype = CODECS[codec]
+        self.chunked = chunked
+        self.sentence_silence = sentence_silence
+        self.pause_silence = pause_silence
+
+        self.params = {
+            "version": CACHE_VERSION,
+            "codec": codec,
+            "speed": SPEED,
+            "lang": LANG,
+            "model": file_fingerprint(MODEL_PATH),
+            "voices": file_fingerprint(VOICES_PATH),
+        }
+        if TTS_BACKEND:
+            # Never mix clips of another synthesizer with the model's
+            self.params["backend"] = TTS_BACKEND
+        self.phoneme_cache = PhonemeCache(self.cache_dir / PHONEMES_FILE)
+
+    def is_stitched(self, message: str) -> bool:
+        """Whether a message is synthesized as several sentences stitched together."""
+        if not self.chunked:
+            return False
+        sentences = split_sentences(message)
+        if not any(sentence for sentence, _ in sentences):
+            # Nothing to say but pauses
+            return False
+        return len(sentences) > 1 or any(pauses for _, pauses in sentences)
+
+    def get_voice_hash(self, voice: str, message: str) -> str:
+        """Generate a unique hash for a voice message and the synthesis parameters."""
+        key = dict(self.params, voice=voice, message=message)
+        # Editing a pronunciation only invalidates the clips that say the word
+        pronunciations = self.phoneme_cache.used_pronunciations(message)
+        if pronunciations:
+            key["pronunciations"] = pronunciations
+        if self.is_stitched(message):
+            key["silence"] = [self.sentence_silence, self.pause_silence]
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get_voice_path(self, voice: str, message: str) -> Path:
+        """Get the cached voice file path for a message."""
+        voice_hash = self.get_voice_hash(voice, message)
+        return self.cache_dir / f"{voice_hash}{self.extension}"
+
+    def contains(self, voice: str, message: str) -> bool:
+        return self.get_voice_path(voice, message).exists()
+
+    def lookup(self, voice: str, message: str) -> Optional[Path]:
+        """Get the path of a cached clip and mark it as used, or None if it is not cached."""
+        voice_path = self.get_voice_path(voice, message)
+        return voice_path if self._touch(voice_path) else None
+
+    @property
+    def index(self) -> dict:
+        """Map of clip hash to its duration, sample rate and size in bytes."""
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _record(self, voice_hash: str, voice_path: Path) -> dict:
+        """Add a clip to the index, merging with entries written by other processes."""
+        return self._record_many([voice_path])[voice_hash]
+
+    def _record_many(self, voice_paths) -> dict:
+        """Add several clips to the index in a single write."""
+        entries = {}
+        for voice_path in voice_paths:
+            info = sf.info(str(voice_path))
+            entries[voice_path.stem] = {
+                "duration": info.duration,
+                "samplerate": info.samplerate,
+                "bytes": voice_path.stat().st_size,
+            }
+
+        with self.lock("index"):
+            index = self._read_index()
+            index.update(entries)
+            write_json(self.index_path, index)
+        self._index = index
+        return entries
+
+    def lock(self, name: str):
+        """Hold an exclusive lock on a single cache entry or the index."""
+        return file_lock(self.cache_dir / f"{name}.lock")
+
+    def generate(self, tts, voice: str, message: str) -> Path:
+        """Generate or retrieve cached voice file for a message."""
+        voice_path = self.get_voice_path(voice, message)
+        if self._touch(voice_path):
+            return voice_path
+
+        with self.lock(voice_path.stem):
+            # Another process may have synthesized it while we waited
+            if self._touch(voice_path):
+                return voice_path
+
+            tmp_path = voice_path.with_name(f"{voice_path.stem}.{os.getpid()}.tmp{self.extension}")
+            try:
+                # Clips are stored in the cache codec, narration.mix_clips decodes them with soundfile
+                if self.is_stitched(message):
+                    self._stitch(tts, voice, message, tmp_path)
+                else:
+                    tts.save(voice, message, str(tmp_path), self.format, self.subtype,
+                             phonemes_path=str(self.phoneme_cache.path))
+                os.replace(tmp_path, voice_path)
+            finally:
+                if tmp_path.exists():
+                    tmp_path.unlink()
+            self._record(voice_path.stem, voice_path)
+        return voice_path
+
+    def generate_many(self, tts, jobs, workers=1):
+        """
+        Generate or retrieve cached voice files for several messages at once.
+
+        Missing clips are synthesized in one batch when the synthesizer
+        supports it (save_many), otherwise one by one.
+
+        Args:
+            tts: Synthesizer to use on cache misses
+            jobs: List of (voice, message) pairs
+            workers: Number of messages synthesized concurrently
+
+        Returns:
+            List of voice file paths in job order
+        """
+        # Stitched messages are synthesized as their sentences
+        pending = []
+        for voice, message in jobs:
+            if self.is_stitched(message):
+                parts = [(voice, sentence) for sentence, _ in split_sentences(message) if sentence]
+            else:
+                parts = [(voice, message)]
+            for part in parts:
+                if part not in pending and not self.contains(*part):
+                    pending.append(part)
+
+        if pending and hasattr(tts, "save_many"):
+            paths = {self.get_voice_path(*job): job for job in pending}
+            with contextlib.ExitStack() as stack:
+                # Always lock in the same order so concurrent batches cannot deadlock
+                for voice_path in sorted(paths):
+                    stack.enter_context(self.lock(voice_path.stem))
+
+                batch = []
+                for voice_path, (voice, message) in paths.items():
+                    # Another process may have synthesized it while we waited
+                    if not voice_path.exists():
+                        tmp_path = voice_path.with_name(f"{voice_path.stem}.{os.getpid()}.tmp{self.extension}")
+                        batch.append((voice, message, tmp_path, voice_path))
+
+                try:
+                    tts.save_many(
+                        [(voice, message, str(tmp_path)) for voice, message, tmp_path, _ in batch],
+                        workers=workers, format=self.format, subtype=self.subtype,
+                        phonemes_path=str(self.phoneme_cache.path)
+                    )
+                    for _, _, tmp_path, voice_path in batch:
+                        os.replace(tmp_path, voice_path)
+                finally:
+                    for _, _, tmp_path, _ in batch:
+                        if tmp_path.exists():
+                            tmp_path.unlink()
+                if batch:
+                    self._record_many([voice_path for _, _, _, voice_path in batch])
+
+        # Stitches the batched sentences, and synthesizes anything left one by one
+        return [self.generate(tts, voice, message) for voice, message in jobs]
+
+    def _stitch(self, tts, voice: str, message: str, path: Path):
+        """Synthesize a message sentence by sentence into a single clip, writing every sentence as it is ready."""
+        silence = 0.0
+        with contextlib.ExitStack() as stack:
+            out = None
+            for sentence, pauses in split_sentences(message):
+                if sentence:
+                    # Every sentence is a cache entry of its own
+                    data, samplerate = sf.read(str(self.generate(tts, voice, sentence)), dtype='float32')
+                    if out is None:
+                        out = stack.enter_context(sf.SoundFile(
+                            str(path), 'w', samplerate, data.shape[1] if data.ndim > 1 else 1,
+                            self.subtype, format=self.format
+                        ))
+                    out.write(np.zeros((int(silence * out.samplerate),) + data.shape[1:], dtype=data.dtype))
+                    out.write(data)
+                    silence = self.sentence_silence
+                silence += pauses * self.pause_silence
+
+            # Only the pauses after the last sentence are kept
+            silence -= self.sentence_silence
+            out.write(np.zeros((int(silence * out.samplerate),) + data.shape[1:], dtype=data.dtype))
+
+    @staticmethod
+    def _touch(voice_path: Path) -> bool:
+        """Mark a clip as used now for LRU eviction, returning whether it exists."""
+        try:
+            os.utime(voice_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _clip_paths(self):
+        """List every clip in the cache, including ones no longer in the index."""
+        return [
+            path for path in self.cache_dir.iterdir()
+            if path.suffix in {extension for extension, _, _ in CODECS.values()}
+            and ".tmp" not in path.suffixes
+        ]
+
+    def _remove(self, paths):
+        """Delete clips and drop them from the index."""
+        for path in paths:
+            with self.lock(path.stem):
+                path.unlink(missing_ok=True)
+                # Processes waiting on the lock notice it is gone, see file_lock
+                path.with_suffix(".lock").unlink(missing_ok=True)
+
+        with self.lock("index"):
+            index = self._read_index()
+            for path in paths:
+                index.pop(path.stem, None)
+            write_json(self.index_path, index)
+        self._index = index
+
+    def evict(self, max_bytes: int):
+        """Delete the least recently used clips until the cache fits in max_bytes."""
+        clips = []
+        for path in self._clip_paths():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            clips.append((stat.st_atime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in clips)
+        evicted = []
+        for _, size, path in sorted(clips, key=lambda clip: clip[0]):
+            if total <= max_bytes:
+                break
+            evicted.append(path)
+            total -= size
+
+        if evicted:
+            self._remove(evicted)
+        return evicted
+
+    def evict_to_budget(self):
+        """Evict clips until the cache fits in max_bytes, if set."""
+        if self.max_bytes is None:
+            return []
+        return self.evict(self.max_bytes)
+
+    def prune(self, jobs):
+        """
+        Delete every clip that is not referenced, and the cached phonemes of text no longer said.
+
+        Args:
+            jobs: (voice, message) pairs that are still in use
+        """
+        referenced = set()
+        for voice, message in jobs:
+            referenced.add(self.get_voice_hash(voice, message))
+            if self.is_stitched(message):
+                referenced.update(
+                    self.get_voice_hash(voice, sentence) for sentence, _ in split_sentences(message) if sentence
+                )
+        pruned = [path for path in self._clip_paths() if path.stem not in referenced]
+
+        if pruned:
+            self._remove(pruned)
+        self.phoneme_cache.prune(message for _, message in jobs)
+        return pruned
+
+    def get_entry(self, voice: str, message: str) -> dict:
+        """Get the index entry of a cached clip."""
+        voice_path = self.get_voice_path(voice, message)
+        entry = self.index.get(voice_path.stem)
+        if entry is None:
+            # Added by another process since the index was loaded, or predates the index
+            self._index = self._read_index()
+            entry = self._index.get(voice_path.stem) or self._record(voice_path.stem, voice_path)
+        return entry
+
+    def get_duration(self, voice: str, message: str) -> float:
+        """Get the length of a cached clip in seconds."""
+        return self.get_entry(voice, message)["duration"]
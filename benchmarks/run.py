@@ -0,0 +1,157 @@
+#!/usr/bin/python
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCHMARK_DIR.parent
+sys.path[:0] = [str(REPO_DIR), str(BENCHMARK_DIR)]
+
+# Read by KokoroTTS on import, so it has to be set before the repo modules are imported
+os.environ.setdefault("MANIMTTS_TTS_BACKEND", "stub_tts:StubTTS")
+
+from VoiceCache import VoiceCache
+from presynth import presynthesize
+from discovery import collect_voice_messages
+
+LECTURE_NAME = "lecture"
+# Spoken in every add_voice call after a unique prefix, about four seconds of stub audio
+SENTENCE = "The number of particles in one mole is about six times ten to the twenty third."
+
+
+def write_lecture(path, scenes, voices):
+    """Write a lecture with the given number of TTSScene classes and add_voice calls per scene."""
+    lines = ["from manim import *", "from TTSScene import TTSScene"]
+    for i in range(scenes):
+        lines += [
+            "", "",
+            f"class Scene{i:03d}(TTSScene):",
+            "    def construct(self):",
+            "        square = Square()",
+            "        self.add(square)",
+        ]
+        for j in range(voices):
+            lines.append(f'        self.add_voice("Scene {i}, part {j}. {SENTENCE}", square.animate.rotate(0.5))')
+    Path(path).write_text("\n".join(lines) + "\n")
+
+def timed(function, *args, **kwargs):
+    """Run a function, returning its wall time in seconds."""
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+def measure_lookups(source_file, cache_dir, repeat=20):
+    """Mean latency of a cached clip lookup as add_voice does it, in microseconds."""
+    cache = VoiceCache(cache_dir)
+    jobs = [job for scene_messages in collect_voice_messages(source_file).values() for job in scene_messages]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for voice, message in jobs:
+            cache.contains(voice, message)
+            cache.get_duration(voice, message)
+    return (time.perf_counter() - start) / (repeat * len(jobs)) * 1e6
+
+def run_build(*args):
+    """Run build.py on the lecture in the current directory, returning its wall time."""
+    cmd = [sys.executable, str(REPO_DIR / "build.py"), LECTURE_NAME, "--quality", "low", *args]
+    # The manim processes import TTSScene from the repo and the stub from here
+    python_path = [str(REPO_DIR), str(BENCHMARK_DIR), os.environ.get("PYTHONPATH", "")]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(python_path))
+    return timed(subprocess.run, cmd, check=True, env=env, stdout=subprocess.DEVNULL)
+
+def measure_merge(source_file):
+    """Time merging the rendered scene videos on their own."""
+    # Only needed with builds, and pulls in the whole video stack
+    from build import get_scene_line_numbers, get_video_files, merge_videos
+    video_files = get_video_files(source_file, "480p15")
+    return timed(merge_videos, video_files, get_scene_line_numbers(source_file), "merged.mp4")
+
+def run_benchmarks(workdir, scenes, voices, build=True):
+    """
+    Run every benchmark in an empty directory.
+
+    Returns:
+        Dict of metric name to value
+    """
+    os.chdir(workdir)
+    source_file = f"{LECTURE_NAME}.py"
+    write_lecture(source_file, scenes, voices)
+    results = {}
+
+    print("Synthesizing voices (cold cache)...")
+    results["synth_cold_s"] = timed(presynthesize, source_file)
+    print("Synthesizing voices (warm cache)...")
+    results["synth_warm_s"] = timed(presynthesize, source_file)
+    results["lookup_us"] = measure_lookups(source_file, "./voices/")
+
+    if build:
+        shutil.rmtree("voices")
+        print("Building (cold cache)...")
+        results["build_cold_s"] = run_build()
+        print("Building (unchanged)...")
+        results["build_noop_s"] = run_build()
+        print("Building (warm cache, every scene re-rendered)...")
+        results["build_warm_s"] = run_build("--force")
+        print("Merging...")
+        results["merge_s"] = measure_merge(source_file)
+
+    # ru_maxrss is in kilobytes, and for children the peak of the largest one
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results["peak_child_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return results
+
+def print_results(results, baseline=None):
+    """Print the metrics of a run, compared to a baseline run if given."""
+    header = f"{'Metric':<20}{'Value':>12}"
+    if baseline is not None:
+        header += f"{'Baseline':>12}{'Change':>9}"
+    print(header)
+    for name, value in results.items():
+        row = f"{name:<20}{value:>12.3f}"
+        before = (baseline or {}).get(name)
+        if before:
+            # Every metric is a time or a size, flag growth beyond noise
+            change = (value - before) / before
+            row += f"{before:>12.3f}{change:>+9.0%}{'  !' if change > 0.1 else ''}"
+        elif baseline is not None:
+            row += f"{'-':>12}{'-':>9}"
+        print(row)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark voice caching and the build with a stub synthesizer.')
+    parser.add_argument('--scenes', type=int, default=12, help='Number of scenes in the lecture (default: 12)')
+    parser.add_argument('--voices', type=int, default=6, help='Number of add_voice calls per scene (default: 6)')
+    parser.add_argument('--rtf', type=float, default=0.1,
+                        help='Seconds the stub spends per second of audio (default: 0.1)')
+    parser.add_argument('--no-build', action='store_true', help='Only benchmark synthesis and cache lookups')
+    parser.add_argument('--save', help='Write the results to this JSON file, to use as a baseline later')
+    parser.add_argument('--baseline', help='Compare with the results saved by an earlier run')
+    args = parser.parse_args()
+
+    # Read when the stub is first created, which happens after this
+    os.environ["MANIMTTS_STUB_RTF"] = str(args.rtf)
+    save_path = Path(args.save).resolve() if args.save else None
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    with tempfile.TemporaryDirectory(prefix="manimtts-bench-") as workdir:
+        results = run_benchmarks(workdir, args.scenes, args.voices, build=not args.no_build)
+        os.chdir(REPO_DIR)
+
+    print_results(results, baseline)
+    if save_path is not None:
+        config = {"scenes": args.scenes, "voices": args.voices, "rtf": args.rtf, "build": not args.no_build}
+        with open(save_path, 'w') as f:
+            json.dump({"config": config, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import time
+import hashlib
+import numpy as np
+from KokoroTTS import KokoroTTS
+
+SAMPLE_RATE = 24000
+# Speaking rate of the synthetic speech
+CHARS_PER_SECOND = 15
+# Seconds spent synthesizing per second of audio, the real model is around 0.1 to 0.3 on a CPU
+REAL_TIME_FACTOR = float(os.environ.get("MANIMTTS_STUB_RTF", 0.1))
+
+
+class StubTTS(KokoroTTS):
+    def __init__(self):
+        """
+        KokoroTTS stand-in that needs no model files.
+
+        Every message becomes a tone whose length follows the message length
+        and whose pitch follows the voice and text, so the same message
+        always produces the same audio. Synthesis takes REAL_TIME_FACTOR
+        seconds per second of audio.
+        """
+
+    def phonemize(self, msg: str, phonemes_path=None):
+        # The tone follows the text, there is no G2P to cache
+        return None
+
+    def create(self, text: str, voice: str, speed: float = 1.0, lang: str = "en-us", phonemes=None):
+        seconds = max(len(text.strip()), 1) / CHARS_PER_SECOND / speed
+        seed = int.from_bytes(hashlib.sha256(f"{voice}:{text}".encode('utf-8')).digest()[:4], "little")
+        frequency = 100 + seed % 200
+
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        samples = (0.3 * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+        time.sleep(seconds * REAL_TIME_FACTOR)
+        return samples, SAMPLE_RATE
@@ -1,41 +1,584 @@
 #!/usr/bin/python
 import os
 import subprocess
-import re
+import json
+import time
+import hashlib
 import argparse
+import tempfile
+import threading
 from pathlib import Path
+import av
+import soundfile as sf
+from imageio_ffmpeg import get_ffmpeg_exe
 from moviepy import VideoFileClip, concatenate_videoclips
 import concurrent.futures
+from discovery import SceneDiscovery, discover_scenes, collect_voice_messages, collect_tex_snippets, SKIP_ALL_ANIMATIONS
+from TTSServer import TTSServer
+from VoiceCache import VoiceCache
+from narration import NARRATION_SAMPLE_RATE, mix_clips
+from watch import FileWatcher
+from texcache import precompile_tex
+import profiling
 
+MANIFEST_PATH = Path("./media/build_manifest.json")
+STATS_PATH = Path("./media/build_stats.json")
+# Timing events of a profiled build as they are recorded, and the report made from them
+PROFILE_EVENTS_PATH = Path("./media/build_profile.jsonl")
+PROFILE_REPORT_PATH = Path("./media/build_profile.json")
+
+# How often running renders check whether the build was cancelled (in seconds)
+CANCEL_POLL_SECONDS = 0.2
+
+# Assumed peak memory of one manim process until one has been measured
+DEFAULT_RENDER_MEMORY = 1536 * 1024 * 1024
+
+# Manim quality flag, quality directory and merge preset of every quality level
+QUALITY_SETTINGS = {
+    "low": ("ql", "480p15", "ultrafast"),
+    "medium": ("qh", "1080p60", "medium"),
+    "high": ("qk", "2160p60", "veryslow"),
+}
 
 def get_scene_line_numbers(filename):
     """Extract line numbers and scene names from the source file."""
-    scene_positions = {}
-    with open(filename, 'r') as f:
-        for line_num, line in enumerate(f, 1):
-            # Look for class definitions that might be scenes
-            match = re.match(r'class\s+(\w+)\s*\([^)]*\bTTSScene\b[^)]*\)', line.strip())
-            if match:
-                scene_name = match.group(1)
-                scene_positions[scene_name] = line_num
-    return scene_positions
-
-def build_scenes(filename, quality_params="qm", threads=6):
-    """Build all scenes in the file using manim with 6 parallel threads."""
-    scene_positions = get_scene_line_numbers(filename)
-    scene_names = scene_positions.keys()
-
-    def run_command(scene_name):
-        """Run the manim command for a single scene."""
+    return {scene_name: scene["line"] for scene_name, scene in discover_scenes(filename).items()}
+
+def hash_file(path):
+    """Hash the contents of a file."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def get_scene_fingerprints(filename, quality_params="qm", video_only=False):
+    """
+    Fingerprint every scene from its class source, everything it depends on,
+    its narration clips and the quality setting.
+
+    Dependencies are the helpers, local modules (including TTSScene.py, but
+    not the build tooling in discovery.TOOLING_MODULES) and asset files the scene uses,
+    plus the top-level statements of the file that affect every scene, such
+    as imports.
+
+    With video_only the narration is left out, the add_voice and set_voice
+    messages as well as the clips, so only changes that can affect the frames
+    change the fingerprint (clip lengths are checked separately).
+    """
+    discovery = SceneDiscovery(filename)
+    shared = discovery.shared_source()
+    directory = Path(filename).parent
+    cache = VoiceCache()
+
+    fingerprints = {}
+    for scene_name, scene in discovery.discover().items():
+        key = {
+            "source": scene["video_source" if video_only else "source"],
+            "shared": shared,
+            "helpers": scene["helpers"],
+            "modules": {module: hash_file(directory / module) for module in scene["modules"]},
+            "assets": {asset: hash_file(directory / asset) for asset in scene["assets"]},
+            "quality": quality_params,
+        }
+        if not video_only:
+            key["clips"] = [cache.get_voice_hash(voice, message) for voice, message in scene["messages"]]
+        fingerprints[scene_name] = hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+    return fingerprints
+
+def load_json(path):
+    """Load build state such as the manifest of rendered scenes."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+def get_frame_count(video_file):
+    """Count the frames of a rendered video."""
+    with av.open(str(video_file)) as container:
+        stream = container.streams.video[0]
+        if stream.frames:
+            return stream.frames
+        return int(container.duration / av.time_base * float(stream.average_rate))
+
+def get_narration_seconds(filename):
+    """Total length of the cached add_voice clips of every scene."""
+    cache = VoiceCache()
+    return {
+        scene_name: sum(
+            cache.get_duration(voice, message)
+            for voice, message in scene_messages
+            if cache.contains(voice, message)
+        )
+        for scene_name, scene_messages in collect_voice_messages(filename).items()
+    }
+
+def estimate_render_seconds(filename, scene_names, stats):
+    """
+    Expected render time of every scene.
+
+    Scenes rendered before use their last render time. New scenes are estimated
+    from their narration length, scaled by the render time per narration second
+    of the known scenes.
+    """
+    narration = get_narration_seconds(filename)
+    ratios = [
+        stats[scene_name]["seconds"] / narration[scene_name]
+        for scene_name in scene_names
+        if scene_name in stats and narration.get(scene_name)
+    ]
+    ratio = sum(ratios) / len(ratios) if ratios else 1.0
+
+    return {
+        scene_name: stats[scene_name]["seconds"] if scene_name in stats
+        else narration.get(scene_name, 0.0) * ratio
+        for scene_name in scene_names
+    }
+
+def get_available_memory():
+    """Get the memory available for new processes in bytes."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+def pick_render_workers(stats, scene_count):
+    """Pick how many manim processes fit the available cores and memory."""
+    cores = len(os.sched_getaffinity(0))
+    render_memory = max(
+        (scene_stats["max_rss"] for scene_stats in stats.values() if "max_rss" in scene_stats),
+        default=DEFAULT_RENDER_MEMORY
+    )
+    by_memory = get_available_memory() // render_memory
+    return max(1, min(cores, by_memory, scene_count))
+
+def get_scene_video(filename, scene_name, quality_name="1080p60"):
+    """Get the path manim renders a scene to."""
+    base_name = Path(filename).stem
+    return Path(f'./media/videos/{base_name}/{quality_name}/{scene_name}.mp4')
+
+def get_scene_timeline(filename, scene_name):
+    """Learn when a scene's animations end and its voices play, without rendering frames."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        timeline_path = Path(tmp_dir) / "timeline.json"
+        cmd = ['manim', '--dry_run', '-n', str(SKIP_ALL_ANIMATIONS), filename, scene_name]
+        env = dict(os.environ, MANIMTTS_TIMELINE=str(timeline_path))
+        # Dry runs would count every voice of the scene a second time
+        env.pop("MANIMTTS_PROFILE", None)
+        subprocess.run(cmd, check=True, env=env, stdout=subprocess.DEVNULL)
+        return load_json(timeline_path)
+
+def plan_segments(timeline, count):
+    """
+    Split a scene into up to count segments of about equal length.
+
+    Segments only start at animations where no earlier voice is still
+    playing, so no voice clip has to be cut between two segments.
+
+    Returns:
+        List of (first, last) animation numbers, or None if the scene cannot be split
+    """
+    ends = timeline["animations"]
+    starts = [0.0] + ends[:-1]
+    boundaries = [
+        i for i in range(1, len(ends))
+        if all(voice["end"] <= starts[i] + 1e-3 for voice in timeline["voices"] if voice["animation"] < i)
+    ]
+    if count < 2 or not boundaries:
+        return None
+
+    chosen = {
+        min(boundaries, key=lambda i: abs(starts[i] - ends[-1] * k / count))
+        for k in range(1, count)
+    }
+    edges = [0] + sorted(chosen) + [len(ends)]
+    return [(edges[j], edges[j + 1] - 1) for j in range(len(edges) - 1)]
+
+def narration_fits(timeline, durations, tolerance):
+    """
+    Whether new clips can replace the narration of a rendered scene without changing its frames.
+
+    add_voice waits out every clip, so besides every clip being within
+    tolerance of the length it was rendered with, the shift the changes add
+    up to has to stay within tolerance at every later voice and at the end.
+
+    Args:
+        timeline: Voices of the render, as recorded by TTSScene
+        durations: Lengths of the new clips in the same order (in seconds)
+        tolerance: Largest allowed difference, one frame interval (in seconds)
+    """
+    voices = timeline["voices"]
+    if len(voices) != len(durations):
+        return False
+
+    shift = 0.0
+    for voice, duration in zip(voices, durations):
+        change = duration - (voice["end"] - voice["start"])
+        if abs(change) > tolerance or abs(shift) > tolerance:
+            return False
+        shift += change * voice["factor"]
+    return abs(shift) <= tolerance
+
+def run_manim(cmd, env=None, cancel=None):
+    """Run a manim command, returning its wall time and peak memory. Setting the cancel event terminates it."""
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, env=env)
+    while True:
+        # wait4 also reports the peak memory of the process
+        pid, status, usage = os.wait4(process.pid, 0 if cancel is None else os.WNOHANG)
+        if pid:
+            break
+        if cancel.wait(CANCEL_POLL_SECONDS):
+            process.terminate()
+            cancel = None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+    return time.perf_counter() - start, usage.ru_maxrss * 1024
+
+def build_scenes(filename, quality_params="qm", threads=None, quality_name="1080p60", force=False, segments=1,
+                 tts=None, on_scene_ready=None, cancel=None):
+    """
+    Build the scenes of a file using manim with parallel threads.
+
+    Scenes whose fingerprint matches their last render are reused unless force
+    is set. The rest start longest first, based on the render times of past
+    runs, and threads defaults to as many processes as cores and memory allow.
+    With segments > 1 every scene is split at voice boundaries into up to that
+    many segments, rendered in parallel and joined back by stream copy.
+
+    With a tts, the voices of every scene are synthesized right before it is
+    queued, so the first scenes render while later ones are still being
+    synthesized. on_scene_ready(scene_name, video_file) is called as soon as
+    a scene video is complete, including reused ones.
+
+    Once the cancel event is set no further scenes or segments start, and
+    renders that are already running are terminated.
+
+    When only the narration of a scene changed and every new clip is within
+    a frame of the length it was rendered with, only the audio track of the
+    existing video is rebuilt. Scenes last rendered in segments are rendered
+    again instead, their recorded timing does not match their frames.
+    """
+    fingerprints = get_scene_fingerprints(filename, quality_params)
+    video_fingerprints = get_scene_fingerprints(filename, quality_params, video_only=True)
+    manifest = load_json(MANIFEST_PATH)
+    rendered = manifest.setdefault(filename, {}).setdefault(quality_name, {})
+    all_stats = load_json(STATS_PATH)
+    stats = all_stats.setdefault(filename, {}).setdefault(quality_name, {})
+    state_lock = threading.Lock()
+
+    scene_names = []
+    for scene_name, fingerprint in fingerprints.items():
+        entry = rendered.get(scene_name)
+        # Entries used to be just the fingerprint
+        if isinstance(entry, dict):
+            entry = entry["fingerprint"]
+        if (not force
+                and entry == fingerprint
+                and get_scene_video(filename, scene_name, quality_name).exists()):
+            print(f"Reusing {scene_name} (unchanged)")
+            if on_scene_ready is not None:
+                on_scene_ready(scene_name, get_scene_video(filename, scene_name, quality_name))
+        else:
+            scene_names.append(scene_name)
+
+    # Longest scenes first, so no long scene starts at the end of the build
+    expected_seconds = estimate_render_seconds(filename, scene_names, stats)
+    scene_names.sort(key=lambda name: expected_seconds[name], reverse=True)
+
+    if threads is None:
+        threads = pick_render_workers(stats, len(scene_names) * segments)
+
+    # Renders then only read TeX from the cache instead of compiling it one snippet at a time
+    tex_snippets = collect_tex_snippets(filename)
+    precompile_tex([snippet for scene_name in scene_names for snippet in tex_snippets[scene_name]], threads)
+
+    # Every job renders a whole scene (segment None) or a (first, last) range of its animations
+    scene_segments = {}
+    print(f"Rendering {len(scene_names)} scenes with {threads} workers")
+    finished_segments = {scene_name: [] for scene_name in scene_names}
+    timelines = {}
+
+    def run_command(scene_name, segment):
+        """Run the manim command for a single scene or segment."""
+        if cancel is not None and cancel.is_set():
+            return
         cmd = ['manim', '-' + quality_params, filename, scene_name, '--disable_caching']
-        subprocess.run(cmd, check=True)
+        if segment is not None:
+            first, last = segment
+            cmd += ['-n', f'{first},{last}', '-o', f'{scene_name}.seg{first}']
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            env = None
+            # Segments skip the animations before them at their exact length, while the frames of the
+            # others round every animation to whole frames, so only whole renders have the video's timing
+            if segment is None:
+                timeline_path = Path(tmp_dir) / "timeline.json"
+                env = dict(os.environ, MANIMTTS_TIMELINE=str(timeline_path))
+            with profiling.span("render", scene=scene_name, segment=segment):
+                try:
+                    seconds, max_rss = run_manim(cmd, env, cancel)
+                except subprocess.CalledProcessError:
+                    if cancel is not None and cancel.is_set():
+                        # Terminated, the scene renders again in the next build
+                        return
+                    raise
+            if env is not None:
+                timeline = load_json(timeline_path)
+                timelines[scene_name] = {
+                    "duration": timeline["duration"],
+                    "voices": [
+                        {key: voice[key] for key in ("animation", "start", "end", "factor")}
+                        for voice in timeline["voices"]
+                    ],
+                } if timeline else None
+
+        with state_lock:
+            finished = finished_segments[scene_name]
+            finished.append((seconds, max_rss))
+            if len(finished) < len(scene_segments[scene_name]):
+                return
+
+        scene_video = get_scene_video(filename, scene_name, quality_name)
+        if segment is not None:
+            segment_videos = [
+                get_scene_video(filename, f"{scene_name}.seg{first}", quality_name)
+                for first, _ in scene_segments[scene_name]
+            ]
+            concat_videos_copy(segment_videos, str(scene_video))
+            for segment_video in segment_videos:
+                segment_video.unlink()
+
+        scene_stats = {
+            "seconds": sum(seconds for seconds, _ in finished),
+            "frames": get_frame_count(scene_video),
+            "max_rss": max(max_rss for _, max_rss in finished),
+        }
+        with state_lock:
+            rendered[scene_name] = {
+                "fingerprint": fingerprints[scene_name],
+                "video": video_fingerprints[scene_name],
+                # Voice timing of the frames, kept as is by later narration remuxes
+                "timeline": timelines.get(scene_name),
+            }
+            save_json(MANIFEST_PATH, manifest)
+            stats[scene_name] = scene_stats
+            save_json(STATS_PATH, all_stats)
+        profiling.record("scene", scene=scene_name, frames=scene_stats["frames"], max_rss=scene_stats["max_rss"])
+        if on_scene_ready is not None:
+            on_scene_ready(scene_name, scene_video)
+
+    def start_scene(scene_name):
+        """Split a scene into segments if requested and queue its render jobs."""
+        scene_segments[scene_name] = [None]
+        if segments > 1:
+            # The dry run needs the voices, so a scene is only planned once they are synthesized
+            with profiling.span("plan", scene=scene_name):
+                timeline = get_scene_timeline(filename, scene_name)
+            scene_segments[scene_name] = plan_segments(timeline, segments) or [None]
+        with state_lock:
+            futures.extend(
+                executor.submit(run_command, scene_name, segment)
+                for segment in scene_segments[scene_name]
+            )
+
+    def get_remux_clips(scene_name):
+        """
+        The new clips of a scene, if only its narration changed and they fit the rendered timing.
+
+        The voices come from a dry run of the scene rather than from its
+        source, so they line up with the rendered ones even when add_voice
+        runs in loops or conditionals.
+
+        Returns:
+            List of (path, time, length) of every clip, or None if the scene has to be rendered
+        """
+        entry = rendered.get(scene_name)
+        scene_video = get_scene_video(filename, scene_name, quality_name)
+        if (force
+                or not isinstance(entry, dict)
+                or entry["video"] != video_fingerprints[scene_name]
+                or not entry["timeline"]
+                or not scene_video.exists()):
+            return None
+        # Dry runs synthesize missing clips, leave those scenes to the render
+        if not all(cache.contains(voice, message) for voice, message in voice_messages.get(scene_name, [])):
+            return None
+
+        with profiling.span("plan", scene=scene_name):
+            voices = get_scene_timeline(filename, scene_name)["voices"]
+        rendered_voices = entry["timeline"]["voices"]
+        if [voice["animation"] for voice in voices] != [voice.get("animation") for voice in rendered_voices]:
+            return None
+        if not all(cache.contains(voice["voice"], voice["message"]) for voice in voices):
+            return None
+
+        with av.open(str(scene_video)) as container:
+            frame_interval = 1 / float(container.streams.video[0].average_rate)
+        durations = [cache.get_duration(voice["voice"], voice["message"]) for voice in voices]
+        if not narration_fits(entry["timeline"], durations, frame_interval):
+            return None
+        return [
+            (cache.get_voice_path(voice["voice"], voice["message"]), rendered_voice["start"], duration)
+            for voice, rendered_voice, duration in zip(voices, rendered_voices, durations)
+        ]
+
+    def update_scene(scene_name):
+        """Remux the narration of a scene if that is all that changed, render it otherwise."""
+        clips = get_remux_clips(scene_name)
+        if clips is None:
+            start_scene(scene_name)
+        else:
+            remux_scene(scene_name, clips)
 
-    # Using ThreadPoolExecutor to handle parallel execution with 6 workers
+    def remux_scene(scene_name, clips):
+        """Rebuild the audio track of a scene video from its new clips, keeping the frames."""
+        timeline = rendered[scene_name]["timeline"]
+        scene_video = get_scene_video(filename, scene_name, quality_name)
+        # As long as TTSScene makes it, the last clip plays to its end
+        end = max([timeline["duration"]] + [time + length for _, time, length in clips])
+        with profiling.span("remux", scene=scene_name):
+            remux_narration(scene_video, [(path, time) for path, time, _ in clips], end)
+        print(f"Remuxed the narration of {scene_name} (timing unchanged)")
+
+        with state_lock:
+            rendered[scene_name]["fingerprint"] = fingerprints[scene_name]
+            save_json(MANIFEST_PATH, manifest)
+        if on_scene_ready is not None:
+            on_scene_ready(scene_name, scene_video)
+
+    cache = VoiceCache()
+    voice_messages = collect_voice_messages(filename)
+    futures = []
     with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
-        futures = [executor.submit(run_command, name) for name in scene_names]
-        # Wait for all futures to complete and propagate any exceptions
-        for future in concurrent.futures.as_completed(futures):
+        for scene_name in scene_names:
+            if cancel is not None and cancel.is_set():
+                break
+            if tts is not None and voice_messages.get(scene_name):
+                # Synthesized while the scenes queued before it render
+                with profiling.span("presynthesize", scene=scene_name):
+                    cache.generate_many(tts, voice_messages[scene_name])
+            with state_lock:
+                futures.append(executor.submit(update_scene, scene_name))
+
+        # Wait for all futures to complete and propagate any exceptions,
+        # including the render jobs queued by start_scene while waiting
+        done = 0
+        while True:
+            with state_lock:
+                if done == len(futures):
+                    break
+                future = futures[done]
             future.result()
+            done += 1
+
+    # Only once every scene has mixed its clips, evicting earlier could delete clips a render still needs
+    cache.evict_to_budget()
+
+class SceneMuxer:
+    def __init__(self, scene_names, output_file):
+        """
+        Append scene videos to the lecture by stream copy as they finish.
+
+        A scene is muxed as soon as it and every scene before it are ready, so
+        once the last scene renders only the container index is left to write.
+        When a scene differs in stream parameters muxing stops, and the
+        lecture has to be merged with merge_videos after the build instead.
+
+        Args:
+            scene_names: Scenes in the order they appear in the lecture
+            output_file: Path of the lecture video
+        """
+        self.scene_names = scene_names
+        self.output_file = output_file
+        self.partial_file = Path(output_file).with_suffix(".partial.mp4")
+        self.ready = {}
+        self.next_scene = 0
+        self.failed = False
+        self.params = None
+        self.container = None
+        self.streams = None
+        self.last_dts = None
+        # Where the next scene starts in the lecture (in seconds)
+        self.offset = 0
+        self.lock = threading.Lock()
+
+    def add(self, scene_name, video_file):
+        """Mark a scene as rendered, muxing every scene that is now next in line."""
+        with self.lock:
+            self.ready[scene_name] = video_file
+            while (self.next_scene < len(self.scene_names)
+                    and self.scene_names[self.next_scene] in self.ready):
+                if not self.failed:
+                    with profiling.span("mux", scene=self.scene_names[self.next_scene]):
+                        self._append(self.ready[self.scene_names[self.next_scene]])
+                self.next_scene += 1
+
+    def _append(self, video_file):
+        params = get_stream_params(video_file)
+        if self.params is None:
+            self.params = params
+        elif params != self.params:
+            print(f"{Path(video_file).stem} differs in stream parameters, merging after the build instead")
+            self.failed = True
+            return
+
+        with av.open(str(video_file)) as video_input:
+            if self.container is None:
+                self.container = av.open(str(self.partial_file), mode="w", options={"movflags": "+faststart"})
+                self.streams = [self.container.add_stream(template=stream) for stream in video_input.streams]
+                self.last_dts = [None] * len(self.streams)
+
+            end = self.offset
+            for packet in video_input.demux():
+                # We need to skip the "flushing" packets that `demux` generates.
+                if packet.dts is None:
+                    continue
+                shift = round(self.offset / packet.time_base)
+                packet.pts += shift
+                packet.dts += shift
+                # Audio priming samples overlap the end of the previous scene,
+                # the decoder only needs them at the very start of the lecture
+                index = packet.stream.index
+                dts = packet.dts * packet.time_base
+                if self.last_dts[index] is not None and dts <= self.last_dts[index]:
+                    continue
+                self.last_dts[index] = dts
+                end = max(end, (packet.pts + packet.duration) * packet.time_base)
+                packet.stream = self.streams[index]
+                self.container.mux(packet)
+        self.offset = end
+
+    def abort(self):
+        """Close and delete the partial lecture of a build that did not complete."""
+        with self.lock:
+            # Scenes that still finish afterwards are not muxed
+            self.failed = True
+            if self.container is not None:
+                self.container.close()
+                self.container = None
+            self.partial_file.unlink(missing_ok=True)
+
+    def finish(self):
+        """Write the lecture, returning whether every scene could be muxed."""
+        with self.lock, profiling.span("mux"):
+            if self.container is not None:
+                self.container.close()
+            if self.failed or self.next_scene < len(self.scene_names):
+                self.partial_file.unlink(missing_ok=True)
+                return False
+            os.replace(self.partial_file, self.output_file)
+            return True
 
 def get_video_files(filename, quality_name="1080p60"):
     """Get all MP4 files for the given source file."""
@@ -49,8 +592,85 @@ def get_scene_name_from_video(video_path):
     # Manim typically names videos like Scene_Name.mp4
     return video_path.stem
 
-def merge_videos(video_files, scene_positions, output_file, threads=6, quality_merge="medium"):
-    """Merge videos based on their scene positions in the source file."""
+def get_stream_params(video_file):
+    """Describe the streams of a video by everything that has to match for a stream copy."""
+    params = []
+    with av.open(str(video_file)) as container:
+        for stream in container.streams:
+            codec = stream.codec_context
+            if stream.type == "video":
+                params.append(("video", codec.name, codec.width, codec.height,
+                               codec.pix_fmt, str(stream.average_rate)))
+            elif stream.type == "audio":
+                params.append(("audio", codec.name, codec.sample_rate, codec.layout.name))
+    return params
+
+def can_stream_copy(video_files):
+    """Check whether videos share codecs, resolution, frame rate and audio parameters."""
+    params = [get_stream_params(video_file) for video_file in video_files]
+    return all(p == params[0] for p in params[1:])
+
+def concat_videos_copy(video_files, output_file):
+    """Concatenate videos with the ffmpeg concat demuxer, without re-encoding."""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as list_file:
+        for video_file in video_files:
+            path = str(Path(video_file).resolve()).replace("'", "'\\''")
+            list_file.write(f"file '{path}'\n")
+
+    cmd = [
+        get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_file.name,
+        '-c', 'copy', '-movflags', '+faststart', output_file
+    ]
+    try:
+        subprocess.run(cmd, check=True)
+    finally:
+        os.unlink(list_file.name)
+
+def remux_narration(video_file, clips, duration):
+    """
+    Replace the audio of a video with a newly mixed narration track, copying the video stream.
+
+    The audio is encoded with the sample rate and channels of the track it
+    replaces, so the video can still be merged with the others by stream copy.
+
+    Args:
+        video_file: Video to update in place
+        clips: List of (path, time) pairs of the voice clips and when they start (in seconds)
+        duration: Length of the track (in seconds)
+    """
+    video_file = Path(video_file)
+    with av.open(str(video_file)) as container:
+        if container.streams.audio:
+            audio = container.streams.audio[0].codec_context
+            sample_rate, channels = audio.sample_rate, len(audio.layout.channels)
+        else:
+            sample_rate, channels = NARRATION_SAMPLE_RATE, 1
+
+    wav_file = video_file.with_name(f"{video_file.stem}.narration.wav")
+    tmp_file = video_file.with_name(f"{video_file.stem}.remux.mp4")
+    sf.write(str(wav_file), mix_clips(clips, 0.0, duration), NARRATION_SAMPLE_RATE)
+    cmd = [
+        get_ffmpeg_exe(), '-y', '-loglevel', 'error',
+        '-i', str(video_file), '-i', str(wav_file),
+        '-map', '0:v', '-map', '1:a', '-c:v', 'copy',
+        '-c:a', 'aac', '-ar', str(sample_rate), '-ac', str(channels),
+        '-movflags', '+faststart', str(tmp_file)
+    ]
+    try:
+        subprocess.run(cmd, check=True)
+        os.replace(tmp_file, video_file)
+    finally:
+        wav_file.unlink(missing_ok=True)
+        tmp_file.unlink(missing_ok=True)
+
+def merge_videos(video_files, scene_positions, output_file, threads=6, quality_merge="medium", reencode=False):
+    """
+    Merge videos based on their scene positions in the source file.
+
+    Videos with matching stream parameters are joined by stream copy, anything
+    else (or reencode=True) goes through a full libx264 re-encode.
+    """
     
     # Filter out video files whose scenes aren't in the current source file
     filtered_video_files = []
@@ -66,9 +686,22 @@ def merge_videos(video_files, scene_positions, output_file, threads=6, quality_m
 
     # Sort video files based on their scene's line number
     filtered_video_files.sort(key=lambda x: scene_positions[get_scene_name_from_video(x)])
-    
+
+    # All scenes come from the same manim settings, so usually no re-encode is needed
+    if not reencode:
+        if can_stream_copy(filtered_video_files):
+            with profiling.span("merge", method="copy", scenes=len(filtered_video_files)):
+                concat_videos_copy(filtered_video_files, output_file)
+            return
+        print("Scene videos differ in stream parameters, re-encoding")
+
+    with profiling.span("merge", method="reencode", scenes=len(filtered_video_files)):
+        reencode_videos(filtered_video_files, output_file, threads, quality_merge)
+
+def reencode_videos(video_files, output_file, threads=6, quality_merge="medium"):
+    """Concatenate videos by decoding and re-encoding them with libx264."""
     # Load all video clips
-    clips = [VideoFileClip(str(video_file)) for video_file in filtered_video_files]
+    clips = [VideoFileClip(str(video_file)) for video_file in video_files]
     
     # Concatenate clips
     final_clip = concatenate_videoclips(clips, method="chain")
@@ -85,54 +718,152 @@ def merge_videos(video_files, scene_positions, output_file, threads=6, quality_m
     for clip in clips:
         clip.close()
 
+def build_lecture(source_file, output_file, quality="medium", threads=None, force=False, reencode=False,
+                  segments=1, tts=None, cancel=None):
+    """
+    Build the changed scenes of a file and merge all scenes into the lecture.
+
+    Returns:
+        Whether the lecture was written, False if there were no scene videos
+        or the build was cancelled
+    """
+    quality_params, quality_name, quality_merge = QUALITY_SETTINGS[quality]
+
+    # Step 1: Get line numbers for all scenes
+    scene_positions = get_scene_line_numbers(source_file)
+
+    # Finished scenes are appended to the lecture while the rest still render
+    muxer = SceneMuxer(sorted(scene_positions, key=scene_positions.get), output_file)
+    on_scene_ready = None if reencode else muxer.add
+
+    # Step 2: Synthesize the voices of every scene and build it
+    print("Building scenes...")
+    try:
+        build_scenes(source_file, quality_params, threads, quality_name, force, segments,
+                     tts=tts, on_scene_ready=on_scene_ready, cancel=cancel)
+    except BaseException:
+        muxer.abort()
+        raise
+
+    if muxer.finish():
+        return True
+    if cancel is not None and cancel.is_set():
+        return False
+
+    # Step 3: Get all video files
+    video_files = get_video_files(source_file, quality_name)
+
+    if not video_files:
+        print("No video files found!")
+        return False
+
+    # Step 4: Merge videos
+    print("Merging videos...")
+    merge_videos(video_files, scene_positions, output_file, quality_merge=quality_merge, reencode=reencode)
+    return True
+
+def get_watched_files(source_file):
+    """The source file and every local module and asset its scenes use."""
+    directory = Path(source_file).parent
+    watched = {Path(source_file)}
+    for scene in discover_scenes(source_file).values():
+        watched.update(directory / path for path in scene["modules"] + scene["assets"])
+    return watched
+
+def watch(source_file, output_file, quality="medium", threads=None, segments=1):
+    """
+    Rebuild the lecture every time the source file or anything its scenes use changes.
+
+    Only scenes whose fingerprint changed are rendered, first at low quality
+    into a preview, then at the requested quality in the background. The TTS
+    server stays up the whole time, so the model is only loaded once, and a
+    new change terminates the background render so the next preview starts
+    right away.
+    """
+    preview_file = str(Path(output_file).with_suffix(".preview.mp4"))
+    watcher = FileWatcher(get_watched_files(source_file))
+    full_build = None
+    cancel = threading.Event()
+
+    def build_full():
+        try:
+            if build_lecture(source_file, output_file, quality, threads, segments=segments,
+                             tts=tts_server, cancel=cancel):
+                print(f"Updated {output_file}")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+    with TTSServer.running() as tts_server:
+        while True:
+            try:
+                if build_lecture(source_file, preview_file, "low", threads, segments=segments, tts=tts_server):
+                    print(f"Updated {preview_file}")
+                if quality != "low":
+                    cancel = threading.Event()
+                    full_build = threading.Thread(target=build_full, daemon=True)
+                    full_build.start()
+            except Exception as e:
+                print(f"An error occurred: {e}")
+
+            print(f"Watching {source_file} for changes...")
+            changed = watcher.wait()
+            print(f"Changed: {', '.join(sorted(path.name for path in changed))}")
+
+            if full_build is not None:
+                cancel.set()
+                full_build.join()
+                full_build = None
+            try:
+                watcher.set_paths(get_watched_files(source_file))
+            except SyntaxError:
+                # Keep watching the same files until the source parses again
+                pass
+
 def main():
     parser = argparse.ArgumentParser(description='Build a file with specified quality.')
     parser.add_argument('filename', help='The name of the file to build')
     parser.add_argument('--quality', choices=['low', 'medium', 'high'], 
                         default='medium', help='Quality level (default: medium)')
-    parser.add_argument('--threads', type=int, default=6, help='Number of CPU threads allocated to help render and merge')
+    parser.add_argument('--threads', type=int,
+                        help='Number of parallel manim processes (default: as many as cores and memory allow)')
+    parser.add_argument('--force', action='store_true', help='Re-render every scene, even unchanged ones')
+    parser.add_argument('--reencode', action='store_true', help='Always re-encode when merging instead of copying streams')
+    parser.add_argument('--segments', type=int, default=1,
+                        help='Split every scene into up to this many segments rendered in parallel (default: 1)')
+    parser.add_argument('--profile', action='store_true',
+                        help=f'Record a timing breakdown of the build to {PROFILE_REPORT_PATH}')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep rebuilding changed scenes on every save, with a low quality preview first')
     args = parser.parse_args()
 
     root = args.filename
     # Setup constants
     source_file = f"{root}.py"  # Replace with your file name
     output_file = f"{root}.mp4"
-    
 
-    threads = args.threads
-    quality = args.quality
+    if args.watch:
+        try:
+            watch(source_file, output_file, args.quality, args.threads, args.segments)
+        except KeyboardInterrupt:
+            pass
+        return
 
-    quality_mapping = {
-        "low": ("ql", "480p15", "ultrafast"),
-        "high": ("qk", "2160p60", "veryslow"),
-    }
-
-    # Default to medium if not "low" or "high"
-    quality_params, quality_name, quality_merge = quality_mapping.get(
-        quality, 
-        ("qh", "1080p60", "medium")  # Explicit medium default
-    )
+    if args.profile:
+        PROFILE_EVENTS_PATH.parent.mkdir(parents=True, exist_ok=True)
+        PROFILE_EVENTS_PATH.unlink(missing_ok=True)
+        profiling.enable(PROFILE_EVENTS_PATH)
 
     try:
-        # Step 1: Get line numbers for all scenes
-        scene_positions = get_scene_line_numbers(source_file)
-        
-        # Step 2: Build all scenes
-        print("Building scenes...")
-        build_scenes(source_file, quality_params, threads)
-        
-        # Step 3: Get all video files
-        video_files = get_video_files(source_file, quality_name)
-        
-        if not video_files:
-            print("No video files found!")
-            return
-        
-        # Step 4: Merge videos
-        print("Merging videos...")
-        merge_videos(video_files, scene_positions, output_file)
+        # The scene processes share one model through the TTS server
+        with TTSServer.running() as tts_server:
+            if not build_lecture(source_file, output_file, args.quality, args.threads, args.force,
+                                 args.reencode, args.segments, tts=tts_server):
+                return
         
         print(f"Successfully created {output_file}")
+
+        if args.profile:
+            profiling.print_summary(profiling.write_report(PROFILE_EVENTS_PATH, PROFILE_REPORT_PATH))
         
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -0,0 +1,423 @@
+#!/usr/bin/python
+import os
+import ast
+import copy
+import json
+import argparse
+from pathlib import Path
+from KokoroTTS import DEFAULT_VOICE
+
+# Root of every narrated scene, defined in TTSScene.py
+SCENE_BASE = "TTSScene"
+
+# Starting from this animation skips all of them, so construct() runs without rendering frames.
+# Used by the dry runs of the planner and the build.
+SKIP_ALL_ANIMATIONS = 10**9
+
+# Longer string constants are narration or labels, never file names
+MAX_ASSET_PATH = 255
+
+# Build and synthesis tooling that scenes import but that does not change their frames. Narration is
+# covered by the voice cache keys, so editing these neither re-renders scenes nor wakes the watcher.
+TOOLING_MODULES = {
+    "KokoroTTS", "VoiceCache", "PhonemeCache", "TTSServer", "narration", "sentences",
+    "discovery", "profiling", "texcache", "fileutil", "build", "plan", "presynth", "watch",
+}
+
+# Mobjects that compile their strings with LaTeX, and their arguments that change the compiled code
+TEX_CLASSES = ("Tex", "MathTex")
+TEX_ARGUMENTS = ("arg_separator", "substrings_to_isolate", "tex_environment")
+
+
+def _iter_calls(node):
+    """Yield every call below a node in source order."""
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, ast.Call):
+            # Arguments are evaluated before the call itself
+            yield from _iter_calls(child)
+            yield child
+        else:
+            yield from _iter_calls(child)
+
+def _self_method_name(call):
+    """Return the method name of a `self.<name>(...)` call, or None."""
+    func = call.func
+    if (isinstance(func, ast.Attribute)
+            and isinstance(func.value, ast.Name)
+            and func.value.id == "self"):
+        return func.attr
+    return None
+
+def _literal_string(call):
+    """Return the first positional argument of a call if it is a string literal."""
+    if call.args and isinstance(call.args[0], ast.Constant) and isinstance(call.args[0].value, str):
+        return call.args[0].value
+    return None
+
+def _dotted_name(node):
+    """Return `name` or `module.name` for a base class expression, or None."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name):
+        return f"{node.value.id}.{node.attr}"
+    return None
+
+def _tex_snippet(call):
+    """
+    The class and arguments of a Tex or MathTex call whose TeX code follows from the source, or None.
+
+    Arguments that only style the result, such as colors, are left out.
+    """
+    name = _dotted_name(call.func)
+    if name is None or name.split(".")[-1] not in TEX_CLASSES:
+        return None
+    if any(isinstance(arg, ast.Starred) for arg in call.args) or any(kw.arg is None for kw in call.keywords):
+        return None
+
+    try:
+        args = [ast.literal_eval(arg) for arg in call.args]
+        kwargs = {}
+        color_keys = []
+        for keyword in call.keywords:
+            if keyword.arg == "tex_template":
+                return None
+            if keyword.arg == "tex_to_color_map":
+                # Only its keys change the code, they are isolated after substrings_to_isolate
+                if not isinstance(keyword.value, ast.Dict) or None in keyword.value.keys:
+                    return None
+                color_keys = [ast.literal_eval(key) for key in keyword.value.keys]
+            elif keyword.arg in TEX_ARGUMENTS:
+                kwargs[keyword.arg] = ast.literal_eval(keyword.value)
+    except ValueError:
+        return None
+    if not all(isinstance(arg, str) for arg in args):
+        return None
+
+    if color_keys:
+        kwargs["substrings_to_isolate"] = list(kwargs.get("substrings_to_isolate", [])) + color_keys
+    return {"class": name.split(".")[-1], "args": args, "kwargs": kwargs}
+
+def _without_narration(node):
+    """Source of a class with the literal messages of its add_voice and set_voice calls blanked out."""
+    node = copy.deepcopy(node)
+    for call in _iter_calls(node):
+        if _self_method_name(call) in ("add_voice", "set_voice") and _literal_string(call) is not None:
+            call.args[0] = ast.Constant("")
+    return ast.unparse(node)
+
+def _source(node, lines):
+    """Source of a top-level statement, including its decorators."""
+    start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+
+class SourceFile:
+    def __init__(self, path):
+        """A parsed source file and the names its top-level statements define."""
+        self.path = Path(path)
+        self.text = self.path.read_text()
+        self.lines = self.text.splitlines()
+        self.tree = ast.parse(self.text, filename=str(path))
+
+        # Top-level statements defining a name, by that name
+        self.definitions = {}
+        for node in self.tree.body:
+            for name in self._defined_names(node):
+                self.definitions.setdefault(name, []).append(node)
+
+    @staticmethod
+    def _defined_names(node):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return [node.name]
+        if isinstance(node, ast.Assign):
+            return [target.id for target in node.targets if isinstance(target, ast.Name)]
+        if isinstance(node, (ast.AnnAssign, ast.AugAssign)) and isinstance(node.target, ast.Name):
+            return [node.target.id]
+        return []
+
+    def local_module(self, module_name):
+        """Path of a module next to this file, or None if it is installed elsewhere."""
+        if not module_name:
+            return None
+        path = self.path.parent / (module_name.replace(".", "/") + ".py")
+        return path if path.is_file() else None
+
+
+class SceneDiscovery:
+    def __init__(self, filename):
+        """
+        Find the TTSScene subclasses of a file and what every one of them depends on.
+
+        Scenes are the classes defined in the file that reach TTSScene through
+        their bases, directly, through other classes of the file or through
+        classes imported from modules next to it.
+        """
+        self.filename = filename
+        self._files = {}
+        self._namespaces = {}
+        self.source = self._file(filename)
+
+    def _file(self, path):
+        path = Path(path).resolve()
+        if path not in self._files:
+            self._files[path] = SourceFile(path)
+        return self._files[path]
+
+    def _namespace(self, source):
+        """
+        Map the names a file can use as base classes to their (file, class) definitions.
+
+        Names imported from local modules resolve to the class in that module,
+        `import module` makes its classes available as `module.Class`.
+        """
+        if source.path in self._namespaces:
+            return self._namespaces[source.path]
+        # Guards against import cycles
+        namespace = self._namespaces[source.path] = {}
+
+        for node in source.tree.body:
+            if isinstance(node, ast.ImportFrom) and node.level == 0:
+                module_path = source.local_module(node.module)
+                if module_path is None:
+                    continue
+                module_namespace = self._namespace(self._file(module_path))
+                for alias in node.names:
+                    if alias.name == "*":
+                        namespace.update(module_namespace)
+                    elif alias.name in module_namespace:
+                        namespace[alias.asname or alias.name] = module_namespace[alias.name]
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    module_path = source.local_module(alias.name)
+                    if module_path is None:
+                        continue
+                    module_namespace = self._namespace(self._file(module_path))
+                    prefix = alias.asname or alias.name
+                    for name, definition in module_namespace.items():
+                        if "." not in name:
+                            namespace[f"{prefix}.{name}"] = definition
+            elif isinstance(node, ast.ClassDef):
+                namespace[node.name] = (source, node)
+        return namespace
+
+    def _bases(self, source, node):
+        """Resolve the base classes of a class to their definitions, leaving out installed ones."""
+        namespace = self._namespace(source)
+        bases = []
+        for base in node.bases:
+            name = _dotted_name(base)
+            if name in namespace and namespace[name][1] is not node:
+                bases.append(namespace[name])
+        return bases
+
+    def _is_scene_class(self, source, node, seen=()):
+        if node.name == SCENE_BASE:
+            return True
+        if any(_dotted_name(base) == SCENE_BASE for base in node.bases):
+            return True
+        return any(
+            self._is_scene_class(base_source, base_node, seen + (node,))
+            for base_source, base_node in self._bases(source, node)
+            if base_node not in seen
+        )
+
+    def _class_chain(self, source, node):
+        """The class followed by every class it inherits from that is defined in a local file."""
+        chain = [(source, node)]
+        for source, node in chain:
+            for base in self._bases(source, node):
+                if base not in chain:
+                    chain.append(base)
+        return chain
+
+    def scene_classes(self):
+        """Scene classes defined in the file, by name in source order."""
+        return {
+            node.name: node
+            for node in self.source.tree.body
+            if isinstance(node, ast.ClassDef)
+            and node.name != SCENE_BASE
+            and self._is_scene_class(self.source, node)
+        }
+
+    def voice_messages(self, node):
+        """
+        The (voice, message) pairs of every add_voice call with a literal message.
+
+        Calls are followed from construct() into the scene's own and inherited
+        methods in the order they run, so set_voice in a helper method applies
+        to the messages after it.
+        """
+        # The most derived definition of every method
+        methods = {}
+        for _, class_node in self._class_chain(self.source, node):
+            if class_node.name == SCENE_BASE:
+                continue
+            for statement in class_node.body:
+                if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    methods.setdefault(statement.name, statement)
+
+        voice = DEFAULT_VOICE
+        messages = []
+
+        def visit(method, active):
+            nonlocal voice
+            for call in _iter_calls(method):
+                name = _self_method_name(call)
+                if name == "set_voice" and _literal_string(call) is not None:
+                    voice = _literal_string(call)
+                elif name == "add_voice" and _literal_string(call) is not None:
+                    messages.append((voice, _literal_string(call)))
+                elif name in methods and name not in active:
+                    visit(methods[name], active | {name})
+
+        if "construct" in methods:
+            visit(methods["construct"], {"construct"})
+        return messages
+
+    def dependencies(self, node):
+        """
+        Everything a scene uses besides its own class body.
+
+        Returns:
+            Dict with the source of every top-level definition of the file the
+            scene uses directly or indirectly ("helpers"), the local modules it
+            uses names from ("modules"), the files named by its string
+            constants ("assets"), with paths relative to the file's directory,
+            and its Tex and MathTex calls with literal arguments ("tex")
+        """
+        helpers = {}
+        modules = set()
+        assets = set()
+        tex = {}
+        module_names = self._module_names(self.source)
+
+        pending = [node]
+        visited = set()
+        while pending:
+            current = pending.pop()
+            if id(current) in visited:
+                continue
+            visited.add(id(current))
+
+            for child in ast.walk(current):
+                if isinstance(child, ast.Name):
+                    name = child.id
+                    if name in module_names:
+                        modules.update(self._module_closure(module_names[name]))
+                    if name == getattr(node, "name", None):
+                        continue
+                    for definition in self.source.definitions.get(name, []):
+                        if definition is node:
+                            continue
+                        helpers.setdefault(name, [])
+                        source_text = _source(definition, self.source.lines)
+                        if source_text not in helpers[name]:
+                            helpers[name].append(source_text)
+                        pending.append(definition)
+                elif (isinstance(child, ast.Constant) and isinstance(child.value, str)
+                        and 0 < len(child.value) <= MAX_ASSET_PATH and "\n" not in child.value):
+                    asset = self.source.path.parent / child.value
+                    if asset.is_file():
+                        assets.add(child.value)
+                elif isinstance(child, ast.Call):
+                    snippet = _tex_snippet(child)
+                    if snippet is not None:
+                        tex.setdefault(json.dumps(snippet, sort_keys=True), snippet)
+
+        return {
+            "helpers": {name: "\n".join(sources) for name, sources in sorted(helpers.items())},
+            "modules": sorted(modules),
+            "assets": sorted(assets),
+            "tex": [tex[key] for key in sorted(tex)],
+        }
+
+    def _module_closure(self, path):
+        """A local module and every local module it imports, directly or indirectly, except tooling."""
+        if Path(path).stem in TOOLING_MODULES:
+            return []
+        closure = [Path(path).resolve()]
+        for module_path in closure:
+            for imported in self._module_names(self._file(module_path)).values():
+                if imported.stem not in TOOLING_MODULES and imported.resolve() not in closure:
+                    closure.append(imported.resolve())
+        return [os.path.relpath(module_path, self.source.path.parent) for module_path in closure]
+
+    @staticmethod
+    def _module_names(source):
+        """Map names bound by imports from local modules to the module files."""
+        module_names = {}
+        for node in source.tree.body:
+            if isinstance(node, ast.ImportFrom) and node.level == 0:
+                module_path = source.local_module(node.module)
+                if module_path is not None:
+                    for alias in node.names:
+                        module_names[alias.asname or alias.name] = module_path
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    module_path = source.local_module(alias.name)
+                    if module_path is not None:
+                        module_names[alias.asname or alias.name.split(".")[0]] = module_path
+        return module_names
+
+    def shared_source(self):
+        """Top-level statements that define no name, such as imports and config changes, which affect every scene."""
+        return "\n".join(
+            _source(node, self.source.lines)
+            for node in self.source.tree.body
+            if not SourceFile._defined_names(node)
+        )
+
+    def discover(self):
+        """
+        Describe every scene of the file.
+
+        Returns:
+            Dict of scene name to its class line ("line"), class source
+            ("source"), class source without narration ("video_source"),
+            add_voice messages ("messages") and dependencies, in source order
+        """
+        scenes = {}
+        for name, node in self.scene_classes().items():
+            scenes[name] = {
+                "line": node.lineno,
+                "source": _source(node, self.source.lines),
+                "video_source": _without_narration(node),
+                "messages": self.voice_messages(node),
+                **self.dependencies(node),
+            }
+        return scenes
+
+
+def discover_scenes(filename):
+    """Describe every TTSScene subclass of a file, see SceneDiscovery.discover."""
+    return SceneDiscovery(filename).discover()
+
+def collect_voice_messages(filename):
+    """Extract the (voice, message) pairs of every add_voice call per TTSScene subclass."""
+    return {name: scene["messages"] for name, scene in discover_scenes(filename).items()}
+
+def collect_tex_snippets(filename):
+    """Extract the Tex and MathTex calls with literal arguments per TTSScene subclass."""
+    return {name: scene["tex"] for name, scene in discover_scenes(filename).items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='List the scenes of a file and what they depend on.')
+    parser.add_argument('filename', help='The name of the file to inspect (without .py)')
+    args = parser.parse_args()
+
+    scenes = discover_scenes(f"{args.filename}.py")
+    print(json.dumps({
+        name: {
+            "line": scene["line"],
+            "voices": len(scene["messages"]),
+            "helpers": list(scene["helpers"]),
+            "modules": scene["modules"],
+            "assets": scene["assets"],
+            "tex": len(scene["tex"]),
+        }
+        for name, scene in scenes.items()
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
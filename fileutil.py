@@ -0,0 +1,42 @@
+import os
+import json
+import fcntl
+import contextlib
+from pathlib import Path
+
+
+@contextlib.contextmanager
+def file_lock(path, operation=fcntl.LOCK_EX):
+    """
+    Hold an flock on a file for the duration of a block.
+
+    The holder may delete the lock file. Processes that were waiting on it
+    then find it replaced or gone and lock the file at the path instead.
+    """
+    while True:
+        f = open(path, 'a')
+        try:
+            fcntl.flock(f, operation)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            fcntl.flock(f, fcntl.LOCK_UN)
+        except BaseException:
+            f.close()
+            raise
+        f.close()
+
+    with f:
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def write_json(path: Path, data):
+    """Write a JSON file atomically."""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,42 @@
+import functools
+import numpy as np
+import soundfile as sf
+
+# Sample rate of the narration track, Kokoro's output rate
+NARRATION_SAMPLE_RATE = 24000
+
+# Decoded voice clips kept per process, enough for the clips of a scene without growing over a long watch session
+CLIP_CACHE_SIZE = 64
+
+@functools.lru_cache(maxsize=CLIP_CACHE_SIZE)
+def load_clip(path):
+    """Decode a voice clip to mono float32 samples, returning (samples, sample_rate)."""
+    data, samplerate = sf.read(str(path), dtype='float32', always_2d=True)
+    return data.mean(axis=1), samplerate
+
+def mix_clips(clips, start: float, end: float, samplerate: int = NARRATION_SAMPLE_RATE):
+    """
+    Mix voice clips into a single track.
+
+    Args:
+        clips: List of (path, time) pairs, time being when the clip starts in the scene (in seconds)
+        start: Scene time at which the track starts (in seconds)
+        end: Scene time at which the track ends (in seconds), clips are cut off there
+        samplerate: Sample rate of the track, clips at other rates are resampled
+
+    Returns:
+        Float32 array of samples
+    """
+    track = np.zeros(int(round((end - start) * samplerate)), dtype=np.float32)
+    for path, time in clips:
+        data, clip_rate = load_clip(path)
+        if clip_rate != samplerate:
+            positions = np.arange(int(len(data) * samplerate / clip_rate)) * (clip_rate / samplerate)
+            data = np.interp(positions, np.arange(len(data)), data).astype(np.float32)
+
+        offset = int(round((time - start) * samplerate))
+        first = max(0, -offset)
+        last = min(len(data), len(track) - offset)
+        if first < last:
+            track[offset + first:offset + last] += data[first:last]
+    return track
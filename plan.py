@@ -0,0 +1,105 @@
+#!/usr/bin/python
+import sys
+import json
+import time
+import argparse
+import importlib.util
+from pathlib import Path
+from manim import tempconfig
+from discovery import discover_scenes, SKIP_ALL_ANIMATIONS
+
+# Skipped animations still capture a single frame each, keep those as small as possible
+PLAN_CONFIG = {
+    "dry_run": True,
+    "from_animation_number": SKIP_ALL_ANIMATIONS,
+    "disable_caching": True,
+    "pixel_width": 64,
+    "pixel_height": 36,
+    "progress_bar": "none",
+    "verbosity": "WARNING",
+}
+
+# Narration longer than this is shortened in the printed timeline
+MESSAGE_WIDTH = 60
+
+
+def load_scene_classes(filename):
+    """Import a lecture file and return its TTSScene subclasses by name in source order."""
+    path = Path(filename).resolve()
+    # Lectures import TTSScene and their helper modules from their own directory
+    sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(path.stem, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[path.stem] = module
+    spec.loader.exec_module(module)
+    return {scene_name: getattr(module, scene_name) for scene_name in discover_scenes(filename)}
+
+def plan_scene(scene_class):
+    """
+    Run a scene's construct() without rendering it.
+
+    Every animation is skipped, so play/wait/add_voice only advance the
+    scene time. Voices still come from the cache, synthesizing the ones
+    that are missing.
+
+    Returns:
+        The scene's timeline, see TTSScene.get_timeline
+    """
+    with tempconfig(PLAN_CONFIG):
+        scene = scene_class()
+        scene.render()
+    return scene.get_timeline()
+
+def format_seconds(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
+
+def print_timeline(scene_name, timeline):
+    """Print when every play, wait and voice of a scene runs."""
+    print(f"{scene_name} ({format_seconds(timeline['duration'])})")
+
+    rows = []
+    for play in timeline["plays"]:
+        description = ", ".join(play["animations"]) if play["kind"] == "play" else ""
+        rows.append((play["start"], play["end"], play["kind"], description))
+    for voice in timeline["voices"]:
+        message = " ".join(voice["message"].split())
+        if len(message) > MESSAGE_WIDTH:
+            message = message[:MESSAGE_WIDTH - 3] + "..."
+        if voice["offset"] or voice["factor"] != 1.0:
+            message += f" (offset {voice['offset']:g}s, factor {voice['factor']:g})"
+        rows.append((voice["start"], voice["end"], "voice", message))
+
+    # Voices are listed before the animations they play over
+    for start, end, kind, description in sorted(rows, key=lambda row: (row[0], row[2] != "voice")):
+        print(f"  {start:8.2f} {end:8.2f}  {kind:<6}{description}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute the length of every scene and when its voices play, without rendering.")
+    parser.add_argument('filename', help='The name of the file to plan (without .py)')
+    parser.add_argument('scenes', nargs='*', help='Scenes to plan (default: all)')
+    parser.add_argument('--json', help='Also write the timelines to this JSON file')
+    args = parser.parse_args()
+
+    source_file = f"{args.filename}.py"
+    scene_classes = load_scene_classes(source_file)
+    scene_names = args.scenes or list(scene_classes)
+
+    start = time.perf_counter()
+    timelines = {}
+    total = 0.0
+    for scene_name in scene_names:
+        timelines[scene_name] = plan_scene(scene_classes[scene_name])
+        total += timelines[scene_name]["duration"]
+        print_timeline(scene_name, timelines[scene_name])
+        print()
+
+    print(f"Total: {format_seconds(total)} in {len(scene_names)} scenes "
+          f"(planned in {time.perf_counter() - start:.1f}s)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(timelines, f, indent=2)
+
+if __name__ == "__main__":
+    main()
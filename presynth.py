@@ -0,0 +1,72 @@
+#!/usr/bin/python
+import argparse
+from VoiceCache import VoiceCache
+from KokoroTTS import create_tts
+from discovery import collect_voice_messages
+
+
+def presynthesize(filename, cache_dir="./voices/", tts=None, workers=1):
+    """
+    Synthesize every add_voice message of a file that is not cached yet.
+
+    Args:
+        filename: Source file containing TTSScene subclasses
+        cache_dir: Directory to store cached voice files
+        tts: Synthesizer to use, a fresh one from create_tts if not given
+        workers: Number of messages synthesized concurrently
+    """
+    cache = VoiceCache(cache_dir)
+
+    missing = []
+    for scene_messages in collect_voice_messages(filename).values():
+        for job in scene_messages:
+            if job not in missing and not cache.contains(*job):
+                missing.append(job)
+
+    if not missing:
+        print("Voice cache is up to date")
+        return
+
+    # A single model instance serves the whole batch
+    if tts is None:
+        tts = create_tts()
+    print(f"Synthesizing {len(missing)} voices")
+    cache.generate_many(tts, missing, workers=workers)
+
+def prune(filenames, cache_dir="./voices/"):
+    """Delete cached clips that no add_voice message in the given files references."""
+    cache = VoiceCache(cache_dir)
+
+    jobs = []
+    for filename in filenames:
+        for scene_messages in collect_voice_messages(filename).values():
+            jobs.extend(scene_messages)
+
+    pruned = cache.prune(jobs)
+    print(f"Pruned {len(pruned)} voice clips")
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthesize all voice messages of a file ahead of rendering.')
+    parser.add_argument('filenames', nargs='+', help='The names of the files to synthesize (without .py)')
+    parser.add_argument('--prune', action='store_true',
+                        help='Delete cached clips not referenced by any of the files instead of synthesizing')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of messages synthesized concurrently (default: 1)')
+    parser.add_argument('--max-mb', type=float,
+                        help='Evict least recently used clips until the cache fits in this many megabytes')
+    args = parser.parse_args()
+
+    source_files = [f"{filename}.py" for filename in args.filenames]
+    if args.prune:
+        prune(source_files)
+    else:
+        for source_file in source_files:
+            presynthesize(source_file, workers=args.workers)
+        VoiceCache().evict_to_budget()
+
+    if args.max_mb is not None:
+        evicted = VoiceCache().evict(int(args.max_mb * 1024 * 1024))
+        print(f"Evicted {len(evicted)} voice clips")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+import os
+import json
+import time
+import argparse
+import functools
+import threading
+import contextlib
+
+# JSON-lines file every process of a build appends its timing events to, profiling is off unless set
+PROFILE_PATH = os.environ.get("MANIMTTS_PROFILE")
+
+_write_lock = threading.Lock()
+
+def enable(path):
+    """Record events to a file, in this process and in every process it starts afterwards."""
+    global PROFILE_PATH
+    PROFILE_PATH = str(path)
+    os.environ["MANIMTTS_PROFILE"] = PROFILE_PATH
+
+def record(name, **fields):
+    """Append a single event, doing nothing unless profiling is on."""
+    if not PROFILE_PATH:
+        return
+    event = dict(fields, event=name, pid=os.getpid())
+    event.setdefault("start", time.time())
+    # One write per event, so events of parallel processes never interleave
+    line = json.dumps(event) + "\n"
+    with _write_lock, open(PROFILE_PATH, 'a') as f:
+        f.write(line)
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """
+    Time a block and record it as an event.
+
+    Yields the fields of the event, so the block can add what it finds out
+    while running, such as whether the cache was hit.
+    """
+    start = time.time()
+    begin = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        if PROFILE_PATH:
+            record(name, start=start, seconds=time.perf_counter() - begin, **fields)
+
+def wrap(owner, attribute, name):
+    """Record every call of owner.attribute as an event, for code that can't be instrumented in place."""
+    function = getattr(owner, attribute)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with span(name):
+            return function(*args, **kwargs)
+
+    setattr(owner, attribute, wrapper)
+
+def load_events(path):
+    """Load the events of a build, with start times relative to the first event."""
+    with open(path) as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    events.sort(key=lambda event: event["start"])
+    if events:
+        first = events[0]["start"]
+        for event in events:
+            event["start"] -= first
+    return events
+
+def summarize(events):
+    """
+    Aggregate events per stage and per scene.
+
+    Events without a scene, such as LaTeX compilation, belong to the scene
+    of their process when that process only worked on one scene.
+    """
+    scenes_of_pid = {}
+    for event in events:
+        if "scene" in event:
+            scenes_of_pid.setdefault(event["pid"], set()).add(event["scene"])
+
+    stages = {}
+    scenes = {}
+    for event in events:
+        stage = stages.setdefault(event["event"], {"count": 0, "seconds": 0.0})
+        stage["count"] += 1
+        stage["seconds"] += event.get("seconds", 0.0)
+
+        scene_name = event.get("scene")
+        if scene_name is None and len(scenes_of_pid.get(event["pid"], ())) == 1:
+            scene_name = next(iter(scenes_of_pid[event["pid"]]))
+        if scene_name is None:
+            continue
+        scene = scenes.setdefault(scene_name, {
+            "render_seconds": 0.0, "frames": 0, "voices": 0, "cache_hits": 0,
+            "cache_misses": 0, "tts_seconds": 0.0, "audio_seconds": 0.0, "latex_seconds": 0.0,
+        })
+
+        name = event["event"]
+        if name == "render":
+            scene["render_seconds"] += event["seconds"]
+        elif name == "scene":
+            scene["frames"] = event["frames"]
+        elif name == "add_voice":
+            scene["voices"] += 1
+            scene["audio_seconds"] += event.get("audio_seconds", 0.0)
+        elif name == "generate_voice":
+            scene["cache_hits" if event.get("cache") == "hit" else "cache_misses"] += 1
+            scene["tts_seconds"] += event["seconds"]
+        elif name == "presynthesize":
+            scene["tts_seconds"] += event["seconds"]
+        elif name in ("latex", "latex_svg"):
+            scene["latex_seconds"] += event["seconds"]
+
+    total = max((event["start"] + event.get("seconds", 0.0) for event in events), default=0.0)
+    return {"total_seconds": total, "stages": stages, "scenes": scenes}
+
+def write_report(events_path, report_path):
+    """Write the timeline and summary of a build as one JSON file, returning the summary."""
+    events = load_events(events_path)
+    summary = summarize(events)
+    with open(report_path, 'w') as f:
+        json.dump({"summary": summary, "events": events}, f, indent=2)
+    return summary
+
+def print_summary(summary, baseline=None):
+    """Print the stage and scene tables of a build, compared to a baseline summary if given."""
+    print(f"Total: {summary['total_seconds']:.1f}s")
+
+    header = f"{'Stage':<16}{'Count':>7}{'Seconds':>10}{'Mean':>9}"
+    if baseline is not None:
+        header += f"{'Baseline':>10}{'Change':>9}"
+    print(header)
+    for name, stage in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        row = f"{name:<16}{stage['count']:>7}{stage['seconds']:>10.2f}{stage['seconds'] / stage['count']:>9.3f}"
+        if baseline is not None:
+            before = baseline["stages"].get(name, {}).get("seconds")
+            if before:
+                row += f"{before:>10.2f}{(stage['seconds'] - before) / before:>+9.0%}"
+            else:
+                row += f"{'-':>10}{'-':>9}"
+        print(row)
+
+    if summary["scenes"]:
+        print()
+        print(f"{'Scene':<24}{'Render':>9}{'Frames':>8}{'Voices':>8}{'Hit/Miss':>10}"
+              f"{'TTS':>8}{'Audio':>8}{'LaTeX':>8}")
+        for name, scene in sorted(summary["scenes"].items(), key=lambda item: -item[1]["render_seconds"]):
+            print(
+                f"{name:<24}{scene['render_seconds']:>9.1f}{scene['frames']:>8}{scene['voices']:>8}"
+                f"{scene['cache_hits']:>5}/{scene['cache_misses']:<4}"
+                f"{scene['tts_seconds']:>8.1f}{scene['audio_seconds']:>8.1f}{scene['latex_seconds']:>8.1f}"
+            )
+
+def main():
+    parser = argparse.ArgumentParser(description='Print the timing breakdown of a profiled build.')
+    parser.add_argument('report', help='Report written by build.py --profile')
+    parser.add_argument('--compare', help='Report of an earlier build to compare the stage times with')
+    args = parser.parse_args()
+
+    with open(args.report) as f:
+        summary = json.load(f)["summary"]
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["summary"]
+    print_summary(summary, baseline)
+
+if __name__ == "__main__":
+    main()
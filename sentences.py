@@ -0,0 +1,65 @@
+import re
+
+# Words whose period does not end a sentence, lowercase and without that period
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "st", "vs", "etc", "approx", "fig", "eq", "e.g", "i.e", "cf", "ca",
+}
+
+# A "..." pause marker, or the whitespace after an end mark (and closing quote) when a new sentence starts after it
+SENTENCE_BREAK = re.compile(r"(\.\.\.)|(?:(?<=[.!?])|(?<=[.!?][\"'”’)]))\s+(?=[\"'“‘(]?[A-Z0-9])")
+
+def ends_with_abbreviation(text: str) -> bool:
+    """Whether text ends with an abbreviation or an initial, such as "Mr." or "J."."""
+    words = text.split()
+    if not words or not words[-1].endswith("."):
+        return False
+    word = words[-1][:-1].lstrip("\"'“‘(").lower()
+    return word in ABBREVIATIONS or len(word) == 1 and word.isalpha()
+
+def sentence_breaks(text: str):
+    """Yield the SENTENCE_BREAK matches of a text that are pause markers or really end a sentence."""
+    for match in SENTENCE_BREAK.finditer(text):
+        if match.group(1) or not ends_with_abbreviation(text[:match.start()]):
+            yield match
+
+def split_sentences(msg: str):
+    """
+    Split a message into sentences.
+
+    A sentence ends at ".", "!" or "?" when the next one starts with a
+    capital letter, a digit or a quote, and the period is not part of an
+    abbreviation. "..." markers are pauses, they end the sentence before
+    them too.
+
+    Returns:
+        List of (sentence, pauses) pairs, where pauses counts the "..."
+        markers after the sentence. Markers before the first sentence
+        come first, as ("", pauses).
+
+    >>> split_sentences("Mr. Avogadro counted approx. 6 atoms. Then he stopped.")
+    [('Mr. Avogadro counted approx. 6 atoms.', 0), ('Then he stopped.', 0)]
+    >>> split_sentences("Take water, e.g. this glass. It is wet!")
+    [('Take water, e.g. this glass.', 0), ('It is wet!', 0)]
+    >>> split_sentences("... Is this a question? ... Or is this? ... ... I'm unsure ...")
+    [('', 1), ('Is this a question?', 1), ('Or is this?', 2), ("I'm unsure", 1)]
+    """
+    sentences = []
+    start = 0
+    for match in sentence_breaks(msg):
+        sentence = msg[start:match.start()].strip()
+        if sentence:
+            sentences.append([sentence, 0])
+        if match.group(1):
+            if not sentences:
+                sentences.append(["", 0])
+            sentences[-1][1] += 1
+        start = match.end()
+
+    sentence = msg[start:].strip()
+    if sentence:
+        sentences.append([sentence, 0])
+    return [tuple(sentence) for sentence in sentences]
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
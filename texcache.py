@@ -0,0 +1,120 @@
+#!/usr/bin/python
+import fcntl
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from discovery import collect_tex_snippets
+from fileutil import file_lock
+import profiling
+
+
+def install():
+    """
+    Make Tex and MathTex compile under a lock per snippet, shared by every process using the same media directory.
+
+    A snippet that another process is compiling is waited for and then read
+    from the cache instead of compiled twice. manim deletes the intermediate
+    files of the whole Tex directory after every compile, including those of
+    compiles running in other processes, so that cleanup only runs once no
+    process is compiling.
+    """
+    # Imported here so the build can import this module without loading manim
+    from manim import config
+    from manim.mobject.text import tex_mobject
+    from manim.utils.tex_file_writing import tex_hash, delete_nonsvg_files
+
+    tex_to_svg_file = tex_mobject.tex_to_svg_file
+    if getattr(tex_to_svg_file, "locked", False):
+        return
+
+    def locked_tex_to_svg_file(expression, environment=None, tex_template=None):
+        if tex_template is None:
+            tex_template = config["tex_template"]
+        # The same code and hash manim names the files of the snippet by
+        if environment is not None:
+            code = tex_template.get_texcode_for_expression_in_env(expression, environment)
+        else:
+            code = tex_template.get_texcode_for_expression(expression)
+        snippet_hash = tex_hash(code)
+        tex_dir = Path(config.get_dir("tex_dir"))
+        # The cleanup would delete anything else inside the Tex directory
+        lock_dir = tex_dir.with_name(tex_dir.name + ".locks")
+        lock_dir.mkdir(parents=True, exist_ok=True)
+
+        keep_files = config["no_latex_cleanup"]
+        with file_lock(lock_dir / "compiling.lock", fcntl.LOCK_SH), file_lock(lock_dir / f"{snippet_hash}.lock"):
+            compiled = not (tex_dir / f"{snippet_hash}.svg").exists()
+            config["no_latex_cleanup"] = True
+            try:
+                svg_file = tex_to_svg_file(expression, environment, tex_template)
+            finally:
+                config["no_latex_cleanup"] = keep_files
+
+        if compiled and not keep_files:
+            # The last process to finish compiling cleans up
+            try:
+                with file_lock(lock_dir / "compiling.lock", fcntl.LOCK_EX | fcntl.LOCK_NB):
+                    delete_nonsvg_files()
+            except BlockingIOError:
+                pass
+        return svg_file
+
+    locked_tex_to_svg_file.locked = True
+    tex_mobject.tex_to_svg_file = locked_tex_to_svg_file
+
+def _compile_snippet(snippet):
+    """Create a Tex or MathTex mobject, compiling its SVG unless it is cached. Returns the error, if any."""
+    import manim
+    try:
+        getattr(manim, snippet["class"])(*snippet["args"], **snippet["kwargs"])
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+def precompile_tex(snippets, workers=1):
+    """
+    Compile the SVGs of Tex and MathTex snippets ahead of rendering, in parallel.
+
+    Snippets that are cached already only cost reading their SVG. Renders
+    that use them afterwards find them in manim's Tex cache.
+
+    Args:
+        snippets: Snippets as found by collect_tex_snippets
+        workers: Number of snippets compiled concurrently
+
+    Returns:
+        Number of snippets that failed to compile, their renders report the errors
+    """
+    unique = list({repr(snippet): snippet for snippet in snippets}.values())
+    if not unique:
+        return 0
+
+    workers = max(1, min(workers, len(unique)))
+    print(f"Compiling {len(unique)} TeX snippets with {workers} workers")
+    failed = 0
+    # Spawned rather than forked, the build has threads and possibly a loaded model running
+    context = multiprocessing.get_context("spawn")
+    with profiling.span("latex_precompile", snippets=len(unique)), \
+            ProcessPoolExecutor(workers, mp_context=context, initializer=install) as executor:
+        for snippet, error in zip(unique, executor.map(_compile_snippet, unique)):
+            if error is not None:
+                failed += 1
+                print(f"Could not compile {snippet['class']}{tuple(snippet['args'])}: {error}")
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the Tex and MathTex snippets of a file ahead of rendering.')
+    parser.add_argument('filenames', nargs='+', help='The names of the files to compile (without .py)')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help='Number of snippets compiled concurrently (default: all cores)')
+    args = parser.parse_args()
+
+    snippets = []
+    for filename in args.filenames:
+        for scene_snippets in collect_tex_snippets(f"{filename}.py").values():
+            snippets.extend(scene_snippets)
+    precompile_tex(snippets, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import time
+from pathlib import Path
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+# How often files are checked without inotify (in seconds)
+POLL_INTERVAL = 0.5
+# Editors often write a file in several steps, wait this long for the rest of them (in seconds)
+SETTLE_TIME = 0.2
+
+
+class FileWatcher:
+    def __init__(self, paths):
+        """
+        Wait for changes to a set of files.
+
+        Uses inotify when inotify_simple is installed and polls modification
+        times otherwise. Directories are watched rather than the files
+        themselves, so files that editors save by replacing them are still
+        seen.
+
+        Args:
+            paths: Files to watch
+        """
+        self.inotify = INotify() if INotify is not None else None
+        self.watches = {}
+        self.set_paths(paths)
+
+    def set_paths(self, paths):
+        """Replace the watched files, such as after a scene started using a new asset."""
+        self.paths = {Path(path).resolve() for path in paths}
+        self.snapshot = self._stat_all()
+
+        if self.inotify is not None:
+            directories = {path.parent for path in self.paths}
+            for directory in set(self.watches.values()) - directories:
+                descriptor = next(wd for wd, watched in self.watches.items() if watched == directory)
+                self.inotify.rm_watch(descriptor)
+                del self.watches[descriptor]
+            for directory in directories - set(self.watches.values()):
+                mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE
+                self.watches[self.inotify.add_watch(str(directory), mask)] = directory
+
+    def _stat_all(self):
+        snapshot = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                snapshot[path] = None
+        return snapshot
+
+    def _changed(self):
+        """Files whose modification time or size differs from the last snapshot."""
+        snapshot = self._stat_all()
+        changed = {path for path in self.paths if snapshot[path] != self.snapshot.get(path)}
+        self.snapshot = snapshot
+        return changed
+
+    def wait(self):
+        """Block until at least one watched file changed, returning the changed files."""
+        while True:
+            if self.inotify is not None:
+                events = self.inotify.read()
+                if not any(self.watches.get(event.wd, Path()) / event.name in self.paths for event in events):
+                    continue
+            else:
+                time.sleep(POLL_INTERVAL)
+                if self.snapshot == self._stat_all():
+                    continue
+
+            time.sleep(SETTLE_TIME)
+            if self.inotify is not None:
+                # Drain what arrived while settling
+                self.inotify.read(timeout=0)
+            changed = self._changed()
+            if changed:
+                return changed